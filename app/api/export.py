@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.export_service import ExportService, FORMATS, COLUMNS
+
+export_router = APIRouter()
+
+@export_router.get("/{kind}/{target}.{fmt}")
+async def export_rows(
+    kind: str,
+    target: int,
+    fmt: str,
+    expires: int = Query(...),
+    signature: str = Query(...)
+):
+    if kind not in COLUMNS or fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    # Links are only handed out by the bot to the contest owner or an admin
+    if not ExportService.verify(kind, target, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+    
+    return StreamingResponse(
+        ExportService.stream(kind, target, fmt),
+        # Served as a .gz file rather than Content-Encoding, so clients keep it compressed on disk
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{ExportService.filename(kind, target, fmt)}"'}
+    )
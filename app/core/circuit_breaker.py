@@ -0,0 +1,48 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+    
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        
+        # After reset_timeout let exactly one call through as a probe; its outcome closes or re-opens the circuit.
+        # A probe that never reports back is replaced after another reset_timeout.
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._opened_at = time.monotonic()
+            return True
+        return False
+    
+    def record_success(self) -> bool:
+        recovered = self.state != self.CLOSED
+        self.state = self.CLOSED
+        self.failures = 0
+        if recovered:
+            logger.info(f"{self.name} circuit closed, backend recovered")
+        return recovered
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+    
+    def trip(self):
+        if self.state == self.CLOSED:
+            logger.warning(f"{self.name} circuit opened, failing over for {self.reset_timeout}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
@@ -0,0 +1,85 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Type
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# First byte of every cached payload. Legacy values written with plain json.dumps
+# start with a printable character, so they never collide with a version byte.
+FORMAT_JSON = 1
+
+_encoders: Dict[Type, Callable[[Any], Any]] = {}
+
+def register_encoder(type_: Type, encoder: Callable[[Any], Any]):
+    _encoders[type_] = encoder
+
+def _row_snapshot(obj) -> Any:
+    try:
+        from sqlalchemy import inspect
+        from sqlalchemy.exc import NoInspectionAvailable
+    except ImportError:
+        return None
+    
+    try:
+        state = inspect(obj)
+    except NoInspectionAvailable:
+        return None
+    
+    mapper = getattr(state, "mapper", None)
+    if mapper is None:
+        return None
+    # Only already-loaded columns, so snapshotting never triggers lazy loads on a detached instance
+    return {attr.key: state.dict[attr.key] for attr in mapper.column_attrs if attr.key in state.dict}
+
+def _default(obj):
+    for type_, encoder in _encoders.items():
+        if isinstance(obj, type_):
+            return encoder(obj)
+    
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    
+    snapshot = _row_snapshot(obj)
+    if snapshot is not None:
+        return snapshot
+    
+    raise TypeError(f"Object of type {type(obj).__name__} is not cache-serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    
+    def _dumps(value) -> bytes:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    
+    _loads = orjson.loads
+else:
+    def _dumps(value) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":")).encode()
+    
+    _loads = json.loads
+
+def encode(value) -> bytes:
+    return bytes((FORMAT_JSON,)) + _dumps(value)
+
+def decode(payload: bytes):
+    if not payload:
+        return None
+    
+    version = payload[0]
+    if version == FORMAT_JSON:
+        return _loads(payload[1:])
+    if version >= 0x20:
+        return json.loads(payload)
+    
+    raise ValueError(f"Unknown cache payload version {version}")
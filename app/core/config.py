@@ -23,6 +23,8 @@ class Settings(BaseSettings):
     
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ENCRYPTION_KEY: str = secrets.token_urlsafe(32)
+    # Lifetime of signed /export download links, in seconds
+    EXPORT_LINK_TTL: int = 3600
     
     DEBUG: bool = False
     ENVIRONMENT: str = "development"
@@ -38,6 +40,27 @@ class Settings(BaseSettings):
     DB_MAX_OVERFLOW: int = 20
     REDIS_POOL_SIZE: int = 10
     
+    DB_READ_POOL_SIZE: int = 4
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -64000
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    
+    DB_WRITE_QUEUE_SIZE: int = 10000
+    DB_WRITE_BATCH_SIZE: int = 500
+    DB_WRITE_FLUSH_INTERVAL_MS: int = 200
+    DB_STREAM_BATCH_SIZE: int = 1000
+    DB_SLOW_QUERY_MS: int = 200
+    # Seconds between writes of the in-process active-user sketches
+    ACTIVITY_FLUSH_INTERVAL: int = 60
+    
+    # Contest metrics keep raw points for RAW_DAYS, then per-minute rollups until MINUTE_DAYS, then per-hour ones
+    CONTEST_METRICS_RAW_DAYS: int = 7
+    CONTEST_METRICS_MINUTE_DAYS: int = 30
+    CONTEST_METRICS_COMPACTION_INTERVAL: int = 3600
+    
     @property
     def is_sqlite(self) -> bool:
         return self.DATABASE_URL.startswith("sqlite")
@@ -1,19 +1,35 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, relationship
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, BigInteger, ForeignKey, Index, JSON, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, BigInteger, ForeignKey, Index, JSON, Float, DDL, event
 from sqlalchemy.sql import func
 from datetime import datetime
-from typing import Optional, AsyncGenerator, List, Dict, Any
+from typing import Optional, AsyncGenerator, AsyncIterator, List, Dict, Any, NamedTuple
+from collections import namedtuple
 import enum
 import asyncio
+import contextvars
+import functools
+import inspect
+import itertools
 import logging
+import time
 from contextlib import asynccontextmanager
 import aiosqlite
 import secrets
 
 from app.core.config import settings
+from app.core.hll import HyperLogLog, merge_registers
+from app.core.migrations import (
+    run_migrations, check_query_plans, split_arg, rebuild_rollups, rebuild_contest_histograms,
+    OWNER_STATS_TRIGGERS, OWNER_STATS_BACKFILL
+)
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(f"{__name__}.slow")
+
+# Seconds the current Database call spent waiting for a reader or the writer lock
+_lock_wait: contextvars.ContextVar = contextvars.ContextVar("db_lock_wait", default=None)
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -38,6 +54,17 @@ class ContestStatus(enum.Enum):
     ENDED = "ended"
     CANCELLED = "cancelled"
 
+class JoinStatus(enum.Enum):
+    JOINED = "joined"
+    ALREADY = "already"
+    FULL = "full"
+    INACTIVE = "inactive"
+
+class JoinResult(NamedTuple):
+    status: JoinStatus
+    participant_count: int = 0
+    owner_id: Optional[int] = None
+
 class BroadcastStatus(enum.Enum):
     PENDING = "pending"
     SENDING = "sending"
@@ -61,7 +88,7 @@ class User(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     premium_until = Column(DateTime, nullable=True)
     referral_code = Column(String(255), unique=True, nullable=True)
-    referred_by = Column(BigInteger, ForeignKey("users.id"), nullable=True)
+    referred_by = Column(BigInteger, ForeignKey("users.id"), nullable=True, index=True)
     total_referrals = Column(Integer, default=0)
     
     contests = relationship("Contest", back_populates="owner", foreign_keys="Contest.owner_id")
@@ -116,6 +143,12 @@ class Contest(Base):
     participants = relationship("Participant", back_populates="contest")
     winners = relationship("Winner", back_populates="contest")
     analytics = relationship("ContestAnalytics", back_populates="contest", lazy="dynamic")
+    
+    __table_args__ = (
+        Index('idx_contest_status_start', 'status', 'start_time'),
+        Index('idx_contest_owner_created', 'owner_id', 'created_at'),
+        Index('idx_contest_owner_participants', 'owner_id', 'participant_count'),
+    )
 
 class Participant(Base):
     __tablename__ = "participants"
@@ -196,6 +229,44 @@ class ContestAnalytics(Base):
         Index('idx_contest_metric_time', 'contest_id', 'metric_name', 'timestamp'),
     )
 
+class ContestAnalyticsRollup(Base):
+    __tablename__ = "contest_analytics_rollups"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contest_id = Column(Integer, ForeignKey("contests.id"), nullable=False)
+    metric_name = Column(String(100), nullable=False)
+    # Bucket width in seconds
+    resolution = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    avg_value = Column(Float, nullable=False)
+    last_value = Column(Float, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_contest_rollup_lookup', 'contest_id', 'resolution', 'bucket_start'),
+        Index('idx_contest_rollup_resolution', 'resolution', 'bucket_start'),
+    )
+
+class OwnerStats(Base):
+    __tablename__ = "owner_stats"
+    
+    owner_id = Column(BigInteger, primary_key=True)
+    total_contests = Column(Integer, nullable=False, default=0, server_default="0")
+    active_contests = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_contests = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled_contests = Column(Integer, nullable=False, default=0, server_default="0")
+    total_participants = Column(Integer, nullable=False, default=0, server_default="0")
+    total_views = Column(Integer, nullable=False, default=0, server_default="0")
+    participant_count_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    contests_with_participants = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Maintained by triggers on contests and participants, installed once every table exists
+for _statement in OWNER_STATS_TRIGGERS + [OWNER_STATS_BACKFILL]:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
 class BroadcastMessage(Base):
     __tablename__ = "broadcast_messages"
     
@@ -240,6 +311,10 @@ class Notification(Base):
     created_at = Column(DateTime, default=func.now())
     
     user = relationship("User", back_populates="notifications")
+    
+    __table_args__ = (
+        Index('idx_notification_user_created', 'user_id', 'created_at'),
+    )
 
 @asynccontextmanager
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -261,19 +336,309 @@ async def init_db():
 async def close_db():
     await engine.dispose()
 
+STATS_COUNTERS = (
+    'total_users', 'active_users', 'premium_users', 'total_contests',
+    'active_contests', 'total_participants', 'total_winners'
+)
+
+_ACTIVE_USER = "(CASE WHEN {row}.is_active = 1 AND {row}.is_banned = 0 THEN 1 ELSE 0 END)"
+_PREMIUM_USER = "(CASE WHEN {row}.is_premium = 1 THEN 1 ELSE 0 END)"
+_ACTIVE_CONTEST = "(CASE WHEN {row}.status = 'active' THEN 1 ELSE 0 END)"
+
+def _bump(name: str, delta: str) -> str:
+    return f"UPDATE stats_counters SET value = value + {delta} WHERE name = '{name}';"
+
+# Keep stats_counters exact at write time so get_statistics never scans the big tables
+STATS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+        {_bump('total_users', '1')}
+        {_bump('active_users', _ACTIVE_USER.format(row='NEW'))}
+        {_bump('premium_users', _PREMIUM_USER.format(row='NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users BEGIN
+        {_bump('total_users', '-1')}
+        {_bump('active_users', '-' + _ACTIVE_USER.format(row='OLD'))}
+        {_bump('premium_users', '-' + _PREMIUM_USER.format(row='OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_users_update
+    AFTER UPDATE OF is_active, is_banned, is_premium ON users BEGIN
+        {_bump('active_users', _ACTIVE_USER.format(row='NEW') + ' - ' + _ACTIVE_USER.format(row='OLD'))}
+        {_bump('premium_users', _PREMIUM_USER.format(row='NEW') + ' - ' + _PREMIUM_USER.format(row='OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_contests_insert AFTER INSERT ON contests BEGIN
+        {_bump('total_contests', '1')}
+        {_bump('active_contests', _ACTIVE_CONTEST.format(row='NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_contests_delete AFTER DELETE ON contests BEGIN
+        {_bump('total_contests', '-1')}
+        {_bump('active_contests', '-' + _ACTIVE_CONTEST.format(row='OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_contests_update AFTER UPDATE OF status ON contests BEGIN
+        {_bump('active_contests', _ACTIVE_CONTEST.format(row='NEW') + ' - ' + _ACTIVE_CONTEST.format(row='OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_participants_insert AFTER INSERT ON participants BEGIN
+        {_bump('total_participants', '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_participants_delete AFTER DELETE ON participants BEGIN
+        {_bump('total_participants', '-1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_winners_insert AFTER INSERT ON winners BEGIN
+        {_bump('total_winners', '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_winners_delete AFTER DELETE ON winners BEGIN
+        {_bump('total_winners', '-1')}
+    END""",
+]
+
 class Database:
-    def __init__(self, db_path: str = "contest_bot.db"):
+    def __init__(self, db_path: str = "contest_bot.db", read_pool_size: int = None):
         self.db_path = db_path
         self.connection = None
+        self.read_pool_size = settings.DB_READ_POOL_SIZE if read_pool_size is None else read_pool_size
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_pool: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._write_flusher: Optional[asyncio.Task] = None
+        # analytics_actions name -> id, and names whose registering insert is queued but not yet resolved
+        self._action_ids: Dict[str, int] = {}
+        self._pending_actions: set = set()
+        # Unix day -> users and event count seen by this process since the last flush
+        self._activity: Dict[int, HyperLogLog] = {}
+        self._activity_events: Dict[int, int] = {}
+        self._activity_flusher: Optional[asyncio.Task] = None
+    
+    @property
+    def is_pooled(self) -> bool:
+        return self._reader_pool is not None
+    
+    async def _apply_pragmas(self, conn: aiosqlite.Connection, read_only: bool = False):
+        await conn.execute(f"PRAGMA busy_timeout = {int(settings.DB_BUSY_TIMEOUT_MS)}")
+        await conn.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+        await conn.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+        await conn.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        await conn.execute(f"PRAGMA temp_store = {settings.SQLITE_TEMP_STORE}")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
     
     async def init_db(self):
         self.connection = await aiosqlite.connect(self.db_path)
+        await self.connection.create_function("hll_merge", 2, merge_registers, deterministic=True)
+        
+        pooled = self.read_pool_size > 0 and self.db_path != ":memory:"
+        if pooled:
+            cursor = await self.connection.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+            journal_mode = (await cursor.fetchone())[0]
+            # Readers only run alongside the writer when the journal is WAL
+            pooled = journal_mode.lower() == "wal"
+        
+        await self._apply_pragmas(self.connection)
         await self.create_tables()
-        logger.info("Database initialized successfully")
+        
+        schema_version = await run_migrations(self.connection)
+        if settings.DEBUG:
+            for name, plan in await check_query_plans(self.connection):
+                logger.warning(f"Hot query {name} does a full scan: {' | '.join(plan)}")
+        
+        if pooled:
+            self._reader_pool = asyncio.Queue()
+            for _ in range(self.read_pool_size):
+                reader = await aiosqlite.connect(self.db_path)
+                await self._apply_pragmas(reader, read_only=True)
+                self._readers.append(reader)
+                self._reader_pool.put_nowait(reader)
+        
+        await self.load_analytics_actions()
+        
+        self._write_queue = asyncio.Queue(maxsize=settings.DB_WRITE_QUEUE_SIZE)
+        self._write_flusher = asyncio.create_task(self._flush_writes())
+        self._activity_flusher = asyncio.create_task(self._flush_activity_periodically())
+        
+        logger.info(
+            f"Database initialized successfully "
+            f"(schema v{schema_version}, {len(self._readers)} readers, pooled={self.is_pooled})"
+        )
     
     async def close(self):
+        if self._activity_flusher:
+            self._activity_flusher.cancel()
+            self._activity_flusher = None
+        await self.flush_activity()
+        await self.drain_writes()
+        
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._reader_pool = None
+        
         if self.connection:
             await self.connection.close()
+            self.connection = None
+    
+    @staticmethod
+    def _add_lock_wait(started: float):
+        waits = _lock_wait.get()
+        if waits is not None:
+            waits[0] += time.perf_counter() - started
+    
+    @asynccontextmanager
+    async def _reader(self):
+        if self._reader_pool is None:
+            yield self.connection
+            return
+        
+        started = time.perf_counter()
+        conn = await self._reader_pool.get()
+        self._add_lock_wait(started)
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _writer(self):
+        started = time.perf_counter()
+        async with self._write_lock:
+            self._add_lock_wait(started)
+            yield self.connection
+    
+    def reader(self):
+        """Borrow a connection for ad-hoc reads; every write goes through a Database method."""
+        return self._reader()
+    
+    async def _enqueue_write(self, query: str, params: tuple = ()):
+        if self._write_queue is None:
+            async with self._writer() as conn:
+                await conn.execute(query, params)
+                await conn.commit()
+            return
+        
+        # Blocks while the queue is full, which throttles producers to the flush rate
+        await self._write_queue.put((query, params))
+    
+    def try_enqueue_write(self, query: str, params: tuple = ()) -> bool:
+        """Queue a write without waiting; returns False when the queue is full or not running."""
+        if self._write_queue is None:
+            return False
+        try:
+            self._write_queue.put_nowait((query, params))
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _flush_writes(self):
+        loop = asyncio.get_running_loop()
+        interval = settings.DB_WRITE_FLUSH_INTERVAL_MS / 1000
+        
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + interval
+            
+            while len(batch) < settings.DB_WRITE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+    
+    async def _write_batch(self, batch: List[tuple]):
+        try:
+            async with self._writer() as conn:
+                try:
+                    # Consecutive rows of the same statement share one executemany, order is kept
+                    for query, group in itertools.groupby(batch, key=lambda item: item[0]):
+                        await conn.executemany(query, [params for _, params in group])
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    logger.warning(f"Flushing {len(batch)} queued writes failed ({e}), retrying one row at a time")
+                    await self._write_rows(conn, batch)
+                
+                if self._pending_actions:
+                    await self._resolve_analytics_actions(conn)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} queued writes: {e}")
+    
+    @staticmethod
+    async def _write_rows(conn: aiosqlite.Connection, batch: List[tuple]):
+        # One savepoint per row so a bad row is skipped without losing the rest of the batch
+        for query, params in batch:
+            await conn.execute("SAVEPOINT queued_write")
+            try:
+                await conn.execute(query, params)
+            except Exception as e:
+                await conn.execute("ROLLBACK TO queued_write")
+                logger.error(f"Dropped queued write {' '.join(query.split())!r} with {params!r}: {e}")
+            await conn.execute("RELEASE queued_write")
+        await conn.commit()
+    
+    async def drain_writes(self):
+        if self._write_queue is None:
+            return
+        
+        await self._write_queue.join()
+        
+        if self._write_flusher:
+            self._write_flusher.cancel()
+            try:
+                await self._write_flusher
+            except asyncio.CancelledError:
+                pass
+        
+        self._write_flusher = None
+        self._write_queue = None
+    
+    @staticmethod
+    async def _fetch_one_dict(conn: aiosqlite.Connection, query: str, params=()) -> Optional[Dict[str, Any]]:
+        cursor = await conn.execute(query, params)
+        row = await cursor.fetchone()
+        if row:
+            columns = [description[0] for description in cursor.description]
+            return dict(zip(columns, row))
+        return None
+    
+    @staticmethod
+    async def _fetch_all_dicts(conn: aiosqlite.Connection, query: str, params=()) -> List[Dict[str, Any]]:
+        cursor = await conn.execute(query, params)
+        rows = await cursor.fetchall()
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    
+    async def _iter_keyset(self, query: str, params: tuple = (), key: str = "id",
+                           batch_size: int = None, as_tuple: bool = False, after: Any = None) -> AsyncIterator[Any]:
+        # query must end with "AND <key> > ? ORDER BY <key> LIMIT ?"; each page takes its own reader
+        batch_size = batch_size or settings.DB_STREAM_BATCH_SIZE
+        last_key = after
+        row_type = None
+        
+        while True:
+            async with self._reader() as conn:
+                cursor = await conn.execute(
+                    query, (*params, last_key if last_key is not None else -(2 ** 63), batch_size)
+                )
+                rows = await cursor.fetchall()
+                columns = [description[0] for description in cursor.description]
+            
+            if not rows:
+                return
+            
+            if as_tuple and row_type is None:
+                row_type = namedtuple("Row", columns, rename=True)
+            
+            for row in rows:
+                yield row_type(*row) if as_tuple else dict(zip(columns, row))
+            
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][columns.index(key)]
     
     async def create_tables(self):
         await self.connection.execute("""
@@ -404,76 +769,236 @@ class Database:
             )
         """)
         
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        cursor = await self.connection.execute("SELECT COUNT(*) FROM stats_counters")
+        if (await cursor.fetchone())[0] == 0:
+            await self._recompute_statistics(self.connection)
+        
+        for trigger in STATS_TRIGGERS:
+            await self.connection.execute(trigger)
+        
         await self.connection.commit()
     
+    async def _recompute_statistics(self, conn: aiosqlite.Connection) -> Dict[str, int]:
+        cursor = await conn.execute("""
+            SELECT COUNT(*),
+            COALESCE(SUM(CASE WHEN is_active = 1 AND is_banned = 0 THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN is_premium = 1 THEN 1 ELSE 0 END), 0)
+            FROM users
+        """)
+        total_users, active_users, premium_users = await cursor.fetchone()
+        
+        cursor = await conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END), 0)
+            FROM contests
+        """)
+        total_contests, active_contests = await cursor.fetchone()
+        
+        cursor = await conn.execute("SELECT COUNT(*) FROM participants")
+        total_participants = (await cursor.fetchone())[0]
+        
+        cursor = await conn.execute("SELECT COUNT(*) FROM winners")
+        total_winners = (await cursor.fetchone())[0]
+        
+        stats = {
+            'total_users': total_users,
+            'active_users': active_users,
+            'premium_users': premium_users,
+            'total_contests': total_contests,
+            'active_contests': active_contests,
+            'total_participants': total_participants,
+            'total_winners': total_winners
+        }
+        
+        await conn.executemany(
+            "INSERT OR REPLACE INTO stats_counters (name, value) VALUES (?, ?)",
+            list(stats.items())
+        )
+        return stats
+    
+    async def reconcile_statistics(self) -> Dict[str, int]:
+        async with self._writer() as conn:
+            stats = await self._recompute_statistics(conn)
+            await conn.commit()
+        return stats
+    
+    async def rebuild_rollups(self):
+        async with self._writer() as conn:
+            await rebuild_rollups(conn)
+            await rebuild_contest_histograms(conn)
+            await conn.commit()
+    
+    async def get_rollup(self, metric: str, since: datetime, until: datetime,
+                         resolution: str = "day") -> List[Dict[str, Any]]:
+        """Row counts per UTC day or hour; buckets with nothing in them are omitted."""
+        seconds, label = (3600, "%Y-%m-%d %H:00") if resolution == "hour" else (86400, "%Y-%m-%d")
+        table, column = ("rollup_hourly", "hour") if resolution == "hour" else ("rollup_daily", "day")
+        
+        async with self._reader() as conn:
+            cursor = await conn.execute(f"""
+                SELECT strftime('{label}', {column} * {seconds}, 'unixepoch'), count FROM {table}
+                WHERE metric = ? AND {column} BETWEEN ? AND ? AND count != 0 ORDER BY {column}
+            """, (metric, int(since.timestamp()) // seconds, int(until.timestamp()) // seconds))
+            return [{"date": row[0], "count": row[1]} for row in await cursor.fetchall()]
+    
+    async def get_top_channels(self, since: datetime, until: datetime, limit: int = 10) -> List[Dict[str, Any]]:
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT ch.title, r.contests, r.participants FROM (
+                    SELECT channel_id, SUM(contests) AS contests, SUM(participants) AS participants
+                    FROM channel_contests_daily WHERE day BETWEEN ? AND ?
+                    GROUP BY channel_id HAVING SUM(contests) > 0
+                    ORDER BY contests DESC LIMIT ?
+                ) r JOIN channels ch ON ch.channel_id = r.channel_id
+                ORDER BY r.contests DESC
+            """, (int(since.timestamp()) // 86400, int(until.timestamp()) // 86400, limit))
+    
+    async def get_top_contest_owners(self, since: datetime, until: datetime, limit: int = 10) -> List[Dict[str, Any]]:
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT u.first_name, u.username, r.contests FROM (
+                    SELECT owner_id, SUM(contests) AS contests
+                    FROM owner_contests_daily WHERE day BETWEEN ? AND ?
+                    GROUP BY owner_id HAVING SUM(contests) > 0
+                    ORDER BY contests DESC LIMIT ?
+                ) r JOIN users u ON u.id = r.owner_id
+                ORDER BY r.contests DESC
+            """, (int(since.timestamp()) // 86400, int(until.timestamp()) // 86400, limit))
+    
     async def create_or_update_user(self, user_id: int, username: str = None, 
                                   first_name: str = None, last_name: str = None, 
                                   language_code: str = "uz") -> Dict[str, Any]:
-        cursor = await self.connection.execute(
-            "SELECT * FROM users WHERE id = ?", (user_id,)
-        )
-        existing_user = await cursor.fetchone()
-        
-        if existing_user:
-            await self.connection.execute("""
-                UPDATE users SET username = ?, first_name = ?, last_name = ?, 
-                language_code = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
-            """, (username, first_name, last_name, language_code, user_id))
-        else:
-            referral_code = secrets.token_urlsafe(8)
-            await self.connection.execute("""
+        async with self._writer() as conn:
+            # The WHERE on the update arm turns a repeat /start with unchanged profile data into a no-op
+            user = await self._fetch_one_dict(conn, """
                 INSERT INTO users (id, username, first_name, last_name, language_code, referral_code)
                 VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_id, username, first_name, last_name, language_code, referral_code))
-        
-        await self.connection.commit()
+                ON CONFLICT(id) DO UPDATE SET
+                    username = excluded.username, first_name = excluded.first_name,
+                    last_name = excluded.last_name, language_code = excluded.language_code,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE username IS NOT excluded.username OR first_name IS NOT excluded.first_name
+                    OR last_name IS NOT excluded.last_name OR language_code IS NOT excluded.language_code
+                RETURNING *
+            """, (user_id, username, first_name, last_name, language_code, secrets.token_urlsafe(8)))
+            await conn.commit()
         
-        cursor = await self.connection.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        row = await cursor.fetchone()
+        if user:
+            return user
         
-        if row:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
-        return {}
+        return await self.get_user(user_id) or {}
     
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        cursor = await self.connection.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        row = await cursor.fetchone()
-        if row:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        async with self._reader() as conn:
+            return await self._fetch_one_dict(conn, "SELECT * FROM users WHERE id = ?", (user_id,))
+    
+    async def set_user_premium(self, user_id: int, premium_until: Optional[datetime]):
+        async with self._writer() as conn:
+            await conn.execute("""
+                UPDATE users SET is_premium = ?, premium_until = ? WHERE id = ?
+            """, (1 if premium_until else 0, premium_until.isoformat() if premium_until else None, user_id))
+            await conn.commit()
+    
+    async def expire_premium_users(self) -> List[int]:
+        async with self._writer() as conn:
+            cursor = await conn.execute("""
+                UPDATE users SET is_premium = 0, premium_until = NULL
+                WHERE is_premium = 1 AND premium_until < datetime('now')
+                RETURNING id
+            """)
+            expired = [row[0] for row in await cursor.fetchall()]
+            await conn.commit()
+        return expired
+    
+    async def set_referrer(self, user_id: int, referral_code: str) -> Optional[int]:
+        """Credit the owner of referral_code for user_id; returns the referrer's id, or None if nobody was credited."""
+        async with self._writer() as conn:
+            cursor = await conn.execute("SELECT id FROM users WHERE referral_code = ?", (referral_code,))
+            referrer = await cursor.fetchone()
+            if not referrer or referrer[0] == user_id:
+                return None
+            
+            try:
+                await conn.execute("""
+                    UPDATE users SET referred_by = ?, total_referrals = total_referrals + 1 
+                    WHERE id = ?
+                """, (referrer[0], user_id))
+                await conn.execute("""
+                    UPDATE users SET total_referrals = total_referrals + 1 WHERE id = ?
+                """, (referrer[0],))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        return referrer[0]
+    
+    async def deactivate_users(self, user_ids: List[int]):
+        if not user_ids:
+            return
+        async with self._writer() as conn:
+            await conn.executemany(
+                "UPDATE users SET is_active = 0 WHERE id = ?", [(user_id,) for user_id in user_ids]
+            )
+            await conn.commit()
     
     async def get_all_active_users(self) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute(
-            "SELECT * FROM users WHERE is_active = 1 AND is_banned = 0"
-        )
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(
+                conn, "SELECT * FROM users WHERE is_active = 1 AND is_banned = 0"
+            )
+    
+    async def iter_active_users(self, batch_size: int = None, as_tuple: bool = False) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
+            SELECT * FROM users WHERE is_active = 1 AND is_banned = 0
+            AND id > ? ORDER BY id LIMIT ?
+        """, batch_size=batch_size, as_tuple=as_tuple):
+            yield row
+    
+    async def iter_active_user_ids(self, batch_size: int = None) -> AsyncIterator[int]:
+        async for row in self._iter_keyset("""
+            SELECT id FROM users WHERE is_active = 1 AND is_banned = 0
+            AND id > ? ORDER BY id LIMIT ?
+        """, batch_size=batch_size, as_tuple=True):
+            yield row[0]
     
     async def add_channel(self, channel_id: int, title: str, username: str, 
                          owner_id: int, member_count: int = 0) -> bool:
         try:
-            await self.connection.execute("""
-                INSERT OR REPLACE INTO channels 
-                (channel_id, title, username, owner_id, member_count)
-                VALUES (?, ?, ?, ?, ?)
-            """, (channel_id, title, username, owner_id, member_count))
-            await self.connection.commit()
+            async with self._writer() as conn:
+                await conn.execute("""
+                    INSERT OR REPLACE INTO channels 
+                    (channel_id, title, username, owner_id, member_count)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (channel_id, title, username, owner_id, member_count))
+                await conn.commit()
             return True
         except Exception as e:
             logger.error(f"Error adding channel: {e}")
             return False
     
+    async def update_channel_member_counts(self, member_counts: Dict[int, int]):
+        """Store fresh member counts, keyed by channels.id."""
+        if not member_counts:
+            return
+        async with self._writer() as conn:
+            await conn.executemany(
+                "UPDATE channels SET member_count = ? WHERE id = ?",
+                [(count, channel_id) for channel_id, count in member_counts.items()]
+            )
+            await conn.commit()
+    
     async def get_user_channels(self, user_id: int) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
-            SELECT * FROM channels WHERE owner_id = ? AND is_active = 1
-            ORDER BY member_count DESC
-        """, (user_id,))
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT * FROM channels WHERE owner_id = ? AND is_active = 1
+                ORDER BY member_count DESC
+            """, (user_id,))
     
     async def create_contest(self, owner_id: int, channel_id: int, title: str,
                            description: str, image_file_id: str = None,
@@ -481,202 +1006,497 @@ class Database:
                            winners_count: int = 1, start_time: str = None,
                            end_time: str = None, max_participants: int = None,
                            prize_description: str = None, requirements: str = None) -> int:
-        cursor = await self.connection.execute("""
-            INSERT INTO contests 
-            (owner_id, channel_id, title, description, image_file_id, 
-             participate_button_text, winners_count, start_time, end_time, 
-             max_participants, prize_description, requirements)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (owner_id, channel_id, title, description, image_file_id,
-              participate_button_text, winners_count, start_time, end_time, 
-              max_participants, prize_description, requirements))
-        
-        contest_id = cursor.lastrowid
-        await self.connection.commit()
+        async with self._writer() as conn:
+            cursor = await conn.execute("""
+                INSERT INTO contests 
+                (owner_id, channel_id, title, description, image_file_id, 
+                 participate_button_text, winners_count, start_time, end_time, 
+                 max_participants, prize_description, requirements)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (owner_id, channel_id, title, description, image_file_id,
+                  participate_button_text, winners_count, start_time, end_time, 
+                  max_participants, prize_description, requirements))
+            
+            contest_id = cursor.lastrowid
+            await conn.commit()
         return contest_id
     
     async def get_contest(self, contest_id: int) -> Optional[Dict[str, Any]]:
-        cursor = await self.connection.execute("SELECT * FROM contests WHERE id = ?", (contest_id,))
-        row = await cursor.fetchone()
-        if row:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
-        return None
+        async with self._reader() as conn:
+            return await self._fetch_one_dict(conn, "SELECT * FROM contests WHERE id = ?", (contest_id,))
     
     async def get_user_contests(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
-            SELECT * FROM contests WHERE owner_id = ? 
-            ORDER BY created_at DESC LIMIT ?
-        """, (user_id, limit))
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT * FROM contests WHERE owner_id = ? 
+                ORDER BY created_at DESC LIMIT ?
+            """, (user_id, limit))
     
     async def get_active_contests(self) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT * FROM contests WHERE status IN ('pending', 'active')
+                ORDER BY created_at DESC
+            """)
+    
+    async def iter_active_contests(self, batch_size: int = None, as_tuple: bool = False) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
             SELECT * FROM contests WHERE status IN ('pending', 'active')
-            ORDER BY created_at DESC
-        """)
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+            AND id > ? ORDER BY id LIMIT ?
+        """, batch_size=batch_size, as_tuple=as_tuple):
+            yield row
+    
+    async def iter_active_channels(self, batch_size: int = None, as_tuple: bool = False) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
+            SELECT * FROM channels WHERE is_active = 1
+            AND id > ? ORDER BY id LIMIT ?
+        """, batch_size=batch_size, as_tuple=as_tuple):
+            yield row
     
     async def update_contest_status(self, contest_id: int, status: str):
-        await self.connection.execute(
-            "UPDATE contests SET status = ? WHERE id = ?", (status, contest_id)
-        )
-        await self.connection.commit()
+        async with self._writer() as conn:
+            await conn.execute(
+                "UPDATE contests SET status = ? WHERE id = ?", (status, contest_id)
+            )
+            await conn.commit()
     
     async def set_contest_message_id(self, contest_id: int, message_id: int):
-        await self.connection.execute(
-            "UPDATE contests SET message_id = ? WHERE id = ?", (message_id, contest_id)
-        )
-        await self.connection.commit()
+        async with self._writer() as conn:
+            await conn.execute(
+                "UPDATE contests SET message_id = ? WHERE id = ?", (message_id, contest_id)
+            )
+            await conn.commit()
+    
+    async def join_contest(self, contest_id: int, user_id: int, referral_source: str = None) -> JoinResult:
+        async with self._writer() as conn:
+            # A savepoint scopes the undo to this join, never to other statements on the writer connection
+            await conn.execute("SAVEPOINT join_contest")
+            try:
+                # The guarded counter bump is the admission check: status, cap and uniqueness in one statement
+                cursor = await conn.execute("""
+                    UPDATE contests SET participant_count = participant_count + 1
+                    WHERE id = ? AND status = 'active'
+                    AND (max_participants IS NULL OR participant_count < max_participants)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM participants WHERE contest_id = ? AND user_id = ?
+                    )
+                    RETURNING participant_count, owner_id
+                """, (contest_id, contest_id, user_id))
+                admitted = await cursor.fetchall()
+                
+                if admitted:
+                    await conn.execute("""
+                        INSERT INTO participants (contest_id, user_id, referral_source) VALUES (?, ?, ?)
+                    """, (contest_id, user_id, referral_source))
+                await conn.execute("RELEASE join_contest")
+                if admitted:
+                    await conn.commit()
+                    return JoinResult(JoinStatus.JOINED, *admitted[0])
+            except aiosqlite.IntegrityError:
+                await conn.execute("ROLLBACK TO join_contest")
+                await conn.execute("RELEASE join_contest")
+                return JoinResult(JoinStatus.ALREADY)
+            except Exception:
+                await conn.execute("ROLLBACK TO join_contest")
+                await conn.execute("RELEASE join_contest")
+                raise
+            
+            cursor = await conn.execute("""
+                SELECT status, max_participants, participant_count, owner_id,
+                EXISTS (SELECT 1 FROM participants WHERE contest_id = ? AND user_id = ?)
+                FROM contests WHERE id = ?
+            """, (contest_id, user_id, contest_id))
+            row = await cursor.fetchone()
+        
+        if not row:
+            return JoinResult(JoinStatus.INACTIVE)
+        
+        status, max_participants, participant_count, owner_id, already = row
+        if already:
+            return JoinResult(JoinStatus.ALREADY, participant_count, owner_id)
+        if status != 'active':
+            return JoinResult(JoinStatus.INACTIVE, participant_count, owner_id)
+        return JoinResult(JoinStatus.FULL, participant_count, owner_id)
     
     async def add_participant(self, contest_id: int, user_id: int, referral_source: str = None) -> bool:
         try:
-            await self.connection.execute("""
-                INSERT INTO participants (contest_id, user_id, referral_source) VALUES (?, ?, ?)
-            """, (contest_id, user_id, referral_source))
-            
-            await self.connection.execute("""
-                UPDATE contests SET participant_count = participant_count + 1 
-                WHERE id = ?
-            """, (contest_id,))
-            
-            await self.connection.commit()
-            return True
-        except Exception:
+            result = await self.join_contest(contest_id, user_id, referral_source)
+            return result.status is JoinStatus.JOINED
+        except Exception as e:
+            logger.error(f"Error adding participant {user_id} to contest {contest_id}: {e}")
             return False
     
     async def is_participating(self, contest_id: int, user_id: int) -> bool:
-        cursor = await self.connection.execute("""
-            SELECT 1 FROM participants WHERE contest_id = ? AND user_id = ?
-        """, (contest_id, user_id))
-        result = await cursor.fetchone()
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                SELECT 1 FROM participants WHERE contest_id = ? AND user_id = ?
+            """, (contest_id, user_id))
+            result = await cursor.fetchone()
         return result is not None
     
     async def get_participants_count(self, contest_id: int) -> int:
-        cursor = await self.connection.execute("""
-            SELECT COUNT(*) FROM participants WHERE contest_id = ?
-        """, (contest_id,))
-        result = await cursor.fetchone()
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                SELECT COUNT(*) FROM participants WHERE contest_id = ?
+            """, (contest_id,))
+            result = await cursor.fetchone()
         return result[0] if result else 0
     
     async def get_contest_participants(self, contest_id: int) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
-            SELECT u.* FROM users u 
-            JOIN participants p ON u.id = p.user_id 
-            WHERE p.contest_id = ?
-            ORDER BY p.joined_at
-        """, (contest_id,))
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT u.* FROM users u 
+                JOIN participants p ON u.id = p.user_id 
+                WHERE p.contest_id = ?
+                ORDER BY p.joined_at
+            """, (contest_id,))
     
-    async def create_winner(self, contest_id: int, user_id: int, position: int):
-        await self.connection.execute("""
-            INSERT INTO winners (contest_id, user_id, position) VALUES (?, ?, ?)
-        """, (contest_id, user_id, position))
+    async def iter_contest_participants(self, contest_id: int, batch_size: int = None,
+                                        as_tuple: bool = False) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
+            SELECT u.*, p.id AS participant_id FROM participants p
+            JOIN users u ON u.id = p.user_id
+            WHERE p.contest_id = ? AND p.id > ? ORDER BY p.id LIMIT ?
+        """, (contest_id,), key="participant_id", batch_size=batch_size, as_tuple=as_tuple):
+            yield row
+    
+    async def iter_contest_participant_ids(self, contest_id: int, batch_size: int = None) -> AsyncIterator[int]:
+        async for row in self._iter_keyset("""
+            SELECT user_id, id FROM participants
+            WHERE contest_id = ? AND id > ? ORDER BY id LIMIT ?
+        """, (contest_id,), batch_size=batch_size, as_tuple=True):
+            yield row[0]
+    
+    async def iter_participant_export(self, contest_id: int, batch_size: int = None) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
+            SELECT p.id, p.user_id, u.username, u.first_name, u.last_name,
+            p.joined_at, p.referral_source, p.is_winner
+            FROM participants p LEFT JOIN users u ON u.id = p.user_id
+            WHERE p.contest_id = ? AND p.id > ? ORDER BY p.id LIMIT ?
+        """, (contest_id,), batch_size=batch_size, as_tuple=True):
+            yield row
+    
+    async def iter_winner_export(self, contest_id: int, batch_size: int = None) -> AsyncIterator[Any]:
+        async for row in self._iter_keyset("""
+            SELECT w.id, w.position, w.user_id, u.username, u.first_name, u.last_name,
+            w.announced_at, w.prize_claimed
+            FROM winners w LEFT JOIN users u ON u.id = w.user_id
+            WHERE w.contest_id = ? AND w.id > ? ORDER BY w.id LIMIT ?
+        """, (contest_id,), batch_size=batch_size, as_tuple=True):
+            yield row
+    
+    async def iter_analytics_events(self, since: int, batch_size: int = None) -> AsyncIterator[Any]:
+        # Start the cursor at the window instead of walking every older event on the first page.
+        # The unary + stops SQLite answering MIN(id) by walking the rowid from the oldest event.
+        async with self._reader() as conn:
+            cursor = await conn.execute("SELECT MIN(+id) FROM analytics_events WHERE ts >= ?", (since,))
+            first_id = (await cursor.fetchone())[0]
+        if first_id is None:
+            return
         
-        await self.connection.execute("""
-            UPDATE participants SET is_winner = 1 
-            WHERE contest_id = ? AND user_id = ?
-        """, (contest_id, user_id))
+        async for row in self._iter_keyset("""
+            SELECT e.id, e.ts, e.user_id, a.name, e.arg_int, e.arg_text, e.chat_id, e.weight
+            FROM analytics_events e JOIN analytics_actions a ON a.id = e.action_id
+            WHERE e.ts >= ? AND e.id > ? ORDER BY e.id LIMIT ?
+        """, (since,), batch_size=batch_size, as_tuple=True, after=first_id - 1):
+            yield row
+    
+    async def get_contest_histograms(self, contest_id: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Join timeline, hour-of-day profile (UTC) and referral sources from the per-contest counters."""
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                SELECT hour, count FROM contest_join_buckets WHERE contest_id = ? AND count != 0 ORDER BY hour
+            """, (contest_id,))
+            buckets = await cursor.fetchall()
+            
+            cursor = await conn.execute("""
+                SELECT source, count FROM contest_referrals WHERE contest_id = ? AND count > 0 ORDER BY count DESC
+            """, (contest_id,))
+            referrals = await cursor.fetchall()
         
-        await self.connection.commit()
+        timeline: Dict[str, int] = {}
+        hourly = [0] * 24
+        for hour, count in buckets:
+            date = datetime.utcfromtimestamp(hour * 3600).strftime("%Y-%m-%d")
+            timeline[date] = timeline.get(date, 0) + count
+            hourly[hour % 24] += count
+        
+        return {
+            "timeline": [{"date": date, "count": count} for date, count in timeline.items()],
+            "hourly": [{"hour": f"{hour:02d}", "count": count} for hour, count in enumerate(hourly) if count],
+            "referrals": [{"source": source, "count": count} for source, count in referrals]
+        }
+    
+    async def create_winner(self, contest_id: int, user_id: int, position: int):
+        async with self._writer() as conn:
+            await conn.execute("""
+                INSERT INTO winners (contest_id, user_id, position) VALUES (?, ?, ?)
+            """, (contest_id, user_id, position))
+            
+            await conn.execute("""
+                UPDATE participants SET is_winner = 1 
+                WHERE contest_id = ? AND user_id = ?
+            """, (contest_id, user_id))
+            
+            await conn.commit()
     
     async def get_contest_winners(self, contest_id: int) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
-            SELECT u.*, w.position FROM users u 
-            JOIN winners w ON u.id = w.user_id 
-            WHERE w.contest_id = ? ORDER BY w.position
-        """, (contest_id,))
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT u.*, w.position FROM users u 
+                JOIN winners w ON u.id = w.user_id 
+                WHERE w.contest_id = ? ORDER BY w.position
+            """, (contest_id,))
     
-    async def log_analytics(self, user_id: int = None, action: str = "", 
-                          data: str = None, ip_address: str = None, user_agent: str = None):
-        await self.connection.execute("""
-            INSERT INTO analytics (user_id, action, data, ip_address, user_agent)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, action, data, ip_address, user_agent))
-        await self.connection.commit()
+    def _analytics_writes(self, user_id: Optional[int], action: str, arg: Optional[str],
+                          chat_id: Optional[int], weight: Optional[float], payload: Optional[str]) -> List[tuple]:
+        arg_int, arg_text = split_arg(arg)
+        ts = int(time.time())
+        action_id = self._action_ids.get(action)
+        if action_id is not None:
+            return [("""
+                INSERT INTO analytics_events (ts, user_id, action_id, arg_int, arg_text, chat_id, weight, payload)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (ts, user_id, action_id, arg_int, arg_text, chat_id, weight, payload))]
+        
+        # Id not known yet: register the name (idempotent) and resolve its id inside the insert
+        return [
+            ("INSERT OR IGNORE INTO analytics_actions (name) VALUES (?)", (action,)),
+            ("""
+                INSERT INTO analytics_events (ts, user_id, action_id, arg_int, arg_text, chat_id, weight, payload)
+                VALUES (?, ?, (SELECT id FROM analytics_actions WHERE name = ?), ?, ?, ?, ?, ?)
+            """, (ts, user_id, action, arg_int, arg_text, chat_id, weight, payload))
+        ]
+    
+    async def load_analytics_actions(self):
+        async with self._reader() as conn:
+            cursor = await conn.execute("SELECT name, id FROM analytics_actions")
+            self._action_ids.update(dict(await cursor.fetchall()))
+    
+    async def _resolve_analytics_actions(self, conn: aiosqlite.Connection):
+        # Names still missing keep their registration riding along with each event until one lands
+        names = list(self._pending_actions)
+        cursor = await conn.execute(
+            f"SELECT name, id FROM analytics_actions WHERE name IN ({', '.join('?' * len(names))})", names
+        )
+        resolved = dict(await cursor.fetchall())
+        self._action_ids.update(resolved)
+        self._pending_actions.difference_update(resolved)
+    
+    async def log_analytics(self, user_id: int = None, action: str = "", data: str = None,
+                            ip_address: str = None, user_agent: str = None, *, arg: str = None,
+                            chat_id: int = None, weight: float = None, payload: str = None):
+        # data is the pre-compaction name for payload; ip_address and user_agent are accepted but no longer stored
+        payload = data if payload is None else payload
+        for query, params in self._analytics_writes(user_id, action, arg, chat_id, weight, payload):
+            await self._enqueue_write(query, params)
+        if action not in self._action_ids:
+            self._pending_actions.add(action)
+    
+    def log_analytics_nowait(self, user_id: int = None, action: str = "", data: str = None,
+                             ip_address: str = None, user_agent: str = None, *, arg: str = None,
+                             chat_id: int = None, weight: float = None, payload: str = None) -> bool:
+        payload = data if payload is None else payload
+        for query, params in self._analytics_writes(user_id, action, arg, chat_id, weight, payload):
+            if not self.try_enqueue_write(query, params):
+                return False
+        if action not in self._action_ids:
+            self._pending_actions.add(action)
+        return True
     
     async def get_analytics_data(self, days: int = 7) -> Dict[str, Any]:
-        cursor = await self.connection.execute("""
-            SELECT action, COUNT(*) as count FROM analytics 
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY action ORDER BY count DESC
-        """.format(days))
-        actions = await cursor.fetchall()
-        
-        cursor = await self.connection.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count FROM analytics 
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY DATE(created_at) ORDER BY date
-        """.format(days))
-        daily_stats = await cursor.fetchall()
+        async with self._reader() as conn:
+            since = int(time.time()) - days * 86400
+            cursor = await conn.execute("""
+                SELECT a.name, COUNT(*) as count FROM analytics_events e
+                JOIN analytics_actions a ON a.id = e.action_id
+                WHERE e.ts >= ?
+                GROUP BY e.action_id ORDER BY count DESC
+            """, (since,))
+            actions = await cursor.fetchall()
+            
+            cursor = await conn.execute("""
+                SELECT DATE(ts, 'unixepoch') as date, COUNT(*) as count FROM analytics_events
+                WHERE ts >= ?
+                GROUP BY ts / 86400 ORDER BY date
+            """, (since,))
+            daily_stats = await cursor.fetchall()
         
         return {
             "actions": [{"action": row[0], "count": row[1]} for row in actions],
             "daily_stats": [{"date": row[0], "count": row[1]} for row in daily_stats]
         }
     
+    def track_activity(self, user_id: int):
+        """Count an update towards today's active users; unsampled and kept in memory until the next flush."""
+        day = int(time.time()) // 86400
+        sketch = self._activity.get(day)
+        if sketch is None:
+            sketch = self._activity[day] = HyperLogLog()
+        sketch.add(user_id)
+        self._activity_events[day] = self._activity_events.get(day, 0) + 1
+    
+    async def flush_activity(self):
+        activity, events = self._activity, self._activity_events
+        self._activity, self._activity_events = {}, {}
+        
+        # hll_merge keeps the upsert correct when several workers flush the same day
+        for day, sketch in activity.items():
+            await self._enqueue_write("""
+                INSERT INTO daily_active_users (day, sketch, events) VALUES (?, ?, ?)
+                ON CONFLICT(day) DO UPDATE SET
+                    sketch = hll_merge(sketch, excluded.sketch),
+                    events = events + excluded.events
+            """, (day, bytes(sketch), events.get(day, 0)))
+    
+    async def _flush_activity_periodically(self):
+        while True:
+            await asyncio.sleep(settings.ACTIVITY_FLUSH_INTERVAL)
+            try:
+                await self.flush_activity()
+            except Exception as e:
+                logger.error(f"Error flushing activity sketches: {e}")
+    
+    async def get_activity_stats(self, windows: tuple = (1, 7, 30)) -> Dict[int, Dict[str, int]]:
+        """Distinct users, user-days and events over the last N calendar days (UTC, today included)."""
+        today = int(time.time()) // 86400
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                SELECT day, sketch, events FROM daily_active_users WHERE day >= ?
+            """, (today - max(windows) + 1,))
+            rows = await cursor.fetchall()
+        
+        days = {day: [HyperLogLog.from_bytes(sketch), events] for day, sketch, events in rows}
+        # Include what this process has not flushed yet
+        for day, sketch in self._activity.items():
+            entry = days.setdefault(day, [HyperLogLog(sketch.precision), 0])
+            entry[0].merge(sketch)
+            entry[1] += self._activity_events.get(day, 0)
+        
+        # Walk back from today, merging one day at a time and reading off each window as it is reached
+        stats = {}
+        merged = HyperLogLog()
+        user_days = events = 0
+        for age in range(max(windows)):
+            if today - age in days:
+                sketch, day_events = days[today - age]
+                merged.merge(sketch)
+                user_days += sketch.count()
+                events += day_events
+            if age + 1 in windows:
+                stats[age + 1] = {"users": merged.count(), "user_days": user_days, "events": events}
+        
+        return stats
+    
     async def create_notification(self, user_id: int, title: str, message: str, 
                                 notification_type: str = "info"):
-        await self.connection.execute("""
+        await self._enqueue_write("""
             INSERT INTO notifications (user_id, title, message, notification_type)
             VALUES (?, ?, ?, ?)
         """, (user_id, title, message, notification_type))
-        await self.connection.commit()
     
     async def get_user_notifications(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        cursor = await self.connection.execute("""
-            SELECT * FROM notifications WHERE user_id = ? 
-            ORDER BY created_at DESC LIMIT ?
-        """, (user_id, limit))
-        rows = await cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        async with self._reader() as conn:
+            return await self._fetch_all_dicts(conn, """
+                SELECT * FROM notifications WHERE user_id = ? 
+                ORDER BY created_at DESC LIMIT ?
+            """, (user_id, limit))
     
     async def mark_notification_read(self, notification_id: int):
-        await self.connection.execute("""
+        await self._enqueue_write("""
             UPDATE notifications SET is_read = 1 WHERE id = ?
         """, (notification_id,))
-        await self.connection.commit()
     
     async def get_statistics(self) -> Dict[str, int]:
-        stats = {}
-        
-        cursor = await self.connection.execute("SELECT COUNT(*) FROM users")
-        stats['total_users'] = (await cursor.fetchone())[0]
-        
-        cursor = await self.connection.execute(
-            "SELECT COUNT(*) FROM users WHERE is_active = 1 AND is_banned = 0"
-        )
-        stats['active_users'] = (await cursor.fetchone())[0]
-        
-        cursor = await self.connection.execute(
-            "SELECT COUNT(*) FROM users WHERE is_premium = 1"
-        )
-        stats['premium_users'] = (await cursor.fetchone())[0]
-        
-        cursor = await self.connection.execute("SELECT COUNT(*) FROM contests")
-        stats['total_contests'] = (await cursor.fetchone())[0]
-        
-        cursor = await self.connection.execute(
-            "SELECT COUNT(*) FROM contests WHERE status = 'active'"
-        )
-        stats['active_contests'] = (await cursor.fetchone())[0]
-        
-        cursor = await self.connection.execute("SELECT COUNT(*) FROM participants")
-        stats['total_participants'] = (await cursor.fetchone())[0]
+        stats = dict.fromkeys(STATS_COUNTERS, 0)
         
-        cursor = await self.connection.execute("SELECT COUNT(*) FROM winners")
-        stats['total_winners'] = (await cursor.fetchone())[0]
+        async with self._reader() as conn:
+            cursor = await conn.execute("SELECT name, value FROM stats_counters")
+            stats.update(await cursor.fetchall())
         
         return stats
 
+def _redact_call(func, args, kwargs) -> str:
+    try:
+        bound = inspect.signature(func).bind_partial(None, *args, **kwargs)
+        items = list(bound.arguments.items())[1:]
+    except TypeError:
+        items = [(str(i), value) for i, value in enumerate(args)] + list(kwargs.items())
+    # Only types are logged, user data never leaves the process through the slow log
+    return ", ".join(f"{name}=<{type(value).__name__}>" for name, value in items)
+
+def _record_call(func, args, kwargs, started: float, rows: int, lock_wait: float = None):
+    duration = time.perf_counter() - started
+    metrics.record_db_call(func.__name__, duration, rows, lock_wait)
+    
+    if duration * 1000 >= settings.DB_SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            f"Slow query {func.__name__} took {duration * 1000:.1f}ms "
+            f"(lock wait {(lock_wait or 0) * 1000:.1f}ms, rows {rows}) "
+            f"args: {_redact_call(func, args, kwargs)}"
+        )
+
+def _timed(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        parent = _lock_wait.get()
+        waits = [0.0]
+        token = _lock_wait.set(waits)
+        started = time.perf_counter()
+        rows = 0
+        try:
+            result = await func(self, *args, **kwargs)
+            if isinstance(result, list):
+                rows = len(result)
+            elif result is not None:
+                rows = 1
+            return result
+        finally:
+            _lock_wait.reset(token)
+            if parent is not None:
+                parent[0] += waits[0]
+            _record_call(func, args, kwargs, started, rows, waits[0])
+    return wrapper
+
+def _timed_iter(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        parent = _lock_wait.get()
+        waits = [0.0]
+        started = time.perf_counter()
+        rows = 0
+        iterator = func(self, *args, **kwargs)
+        try:
+            while True:
+                # Only around each step: between rows the caller's context must not collect into ours
+                token = _lock_wait.set(waits)
+                try:
+                    row = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _lock_wait.reset(token)
+                rows += 1
+                yield row
+        finally:
+            await iterator.aclose()
+            if parent is not None:
+                parent[0] += waits[0]
+            _record_call(func, args, kwargs, started, rows, waits[0])
+    return wrapper
+
+_UNTIMED_METHODS = {"init_db", "close", "create_tables", "drain_writes"}
+
+def _instrument(cls):
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or name in _UNTIMED_METHODS:
+            continue
+        if inspect.isasyncgenfunction(attr):
+            setattr(cls, name, _timed_iter(attr))
+        elif inspect.iscoroutinefunction(attr):
+            setattr(cls, name, _timed(attr))
+    return cls
+
+_instrument(Database)
+
 db = Database()
@@ -0,0 +1,64 @@
+from typing import Hashable, Iterable, Optional
+import hashlib
+import math
+
+# 2^14 one-byte registers: 16 KiB per sketch, ~0.8% standard error
+DEFAULT_PRECISION = 14
+
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+class HyperLogLog:
+    """Distinct-count sketch; sketches of the same precision merge by taking the register-wise max."""
+    
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(self.registers)}")
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(len(data).bit_length() - 1, data)
+    
+    def __bytes__(self) -> bytes:
+        return bytes(self.registers)
+    
+    def add(self, value: Hashable):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        
+        bits = 64 - self.precision
+        index = hashed >> bits
+        # Position of the leftmost 1 in the remaining bits, counting from 1
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def update(self, values: Iterable[Hashable]):
+        for value in values:
+            self.add(value)
+    
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_INVERSE_POWERS[rank] for rank in self.registers)
+        
+        # Small cardinalities are far more accurate with linear counting over the empty registers
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+def merge_registers(left: Optional[bytes], right: Optional[bytes]) -> Optional[bytes]:
+    """SQL function form of merge, so concurrent writers can combine sketches in a single upsert."""
+    if right is None:
+        return left
+    if left is None or len(left) != len(right):
+        return right
+    return bytes(map(max, left, right))
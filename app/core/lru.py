@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import time
+
+_MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 60,
+                 on_evict: Optional[Callable[[Hashable], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(evicted)
+    
+    def delete(self, key: Hashable) -> bool:
+        return self._data.pop(key, _MISSING) is not _MISSING
+    
+    def clear(self):
+        self._data.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __len__(self) -> int:
+        return len(self._data)
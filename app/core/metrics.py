@@ -7,6 +7,20 @@ contest_counter = Counter('contests_total', 'Total contests created', ['status']
 user_counter = Counter('users_total', 'Total users', ['action'])
 response_time = Histogram('bot_response_time_seconds', 'Response time')
 active_users = Gauge('active_users', 'Currently active users')
+db_query_duration = Histogram('db_query_duration_seconds', 'Database call latency', ['method'])
+db_rows_returned = Histogram(
+    'db_rows_returned', 'Rows returned per database call', ['method'],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+)
+db_lock_wait = Histogram(
+    'db_lock_wait_seconds', 'Time spent waiting for a pooled reader or the writer lock', ['method'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+cache_requests = Counter('cache_requests_total', 'Cache lookups', ['namespace', 'tier', 'result'])
+cache_evictions = Counter('cache_evictions_total', 'Entries evicted from the in-process cache', ['namespace'])
+throttled_updates = Counter('throttled_updates_total', 'Updates rejected by throttling', ['route', 'reason'])
+in_flight_updates = Gauge('in_flight_updates', 'Updates currently being handled')
+analytics_events = Counter('analytics_events_total', 'Analytics events by ingestion outcome', ['result'])
 
 def setup_metrics(app: FastAPI):
     @app.get("/metrics")
@@ -33,5 +47,32 @@ class MetricsCollector:
     @staticmethod
     def set_active_users(count: int):
         active_users.set(count)
+    
+    @staticmethod
+    def record_db_call(method: str, duration: float, rows: int, lock_wait: float = None):
+        db_query_duration.labels(method=method).observe(duration)
+        db_rows_returned.labels(method=method).observe(rows)
+        if lock_wait is not None:
+            db_lock_wait.labels(method=method).observe(lock_wait)
+    
+    @staticmethod
+    def record_cache_lookup(namespace: str, tier: str, hit: bool):
+        cache_requests.labels(namespace=namespace, tier=tier, result="hit" if hit else "miss").inc()
+    
+    @staticmethod
+    def record_cache_eviction(namespace: str):
+        cache_evictions.labels(namespace=namespace).inc()
+    
+    @staticmethod
+    def record_throttled(route: str, reason: str):
+        throttled_updates.labels(route=route, reason=reason).inc()
+    
+    @staticmethod
+    def set_in_flight(count: int):
+        in_flight_updates.set(count)
+    
+    @staticmethod
+    def record_analytics_event(result: str):
+        analytics_events.labels(result=result).inc()
 
 metrics = MetricsCollector()
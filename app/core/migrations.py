@@ -0,0 +1,510 @@
+import asyncio
+import logging
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import aiosqlite
+
+from app.core.hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+MigrationStep = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+def split_arg(arg: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """Route parameters are mostly ids; keep those as integers and anything else as text."""
+    if not arg:
+        return None, None
+    try:
+        value = int(arg)
+        if -2 ** 63 <= value < 2 ** 63:
+            return value, None
+    except ValueError:
+        pass
+    return None, arg
+
+def _legacy_action(action: str) -> Tuple[str, Optional[str]]:
+    # Old rows look like "callback:join_contest:123" or "message:<first 20 chars of text>"
+    kind, _, rest = action.partition(":")
+    if kind == "message":
+        return "message:text", None
+    if kind == "callback":
+        route, _, arg = rest.partition(":")
+        return f"callback:{route}", arg or None
+    return action, None
+
+async def _compact_analytics(conn: aiosqlite.Connection):
+    action_ids: Dict[str, int] = {}
+    last_id = 0
+    while True:
+        cursor = await conn.execute("""
+            SELECT id, user_id, action, CAST(strftime('%s', created_at) AS INTEGER)
+            FROM analytics WHERE id > ? ORDER BY id LIMIT 5000
+        """, (last_id,))
+        rows = await cursor.fetchall()
+        if not rows:
+            break
+        
+        events = []
+        for row_id, user_id, action, ts in rows:
+            name, arg = _legacy_action(action)
+            if name not in action_ids:
+                await conn.execute("INSERT OR IGNORE INTO analytics_actions (name) VALUES (?)", (name,))
+                cursor = await conn.execute("SELECT id FROM analytics_actions WHERE name = ?", (name,))
+                action_ids[name] = (await cursor.fetchone())[0]
+            arg_int, arg_text = split_arg(arg)
+            # The old data column held a truncated repr of the whole update and is not carried over
+            events.append((ts, user_id, action_ids[name], arg_int, arg_text))
+        
+        await conn.executemany("""
+            INSERT INTO analytics_events (ts, user_id, action_id, arg_int, arg_text) VALUES (?, ?, ?, ?, ?)
+        """, events)
+        last_id = rows[-1][0]
+    
+    await conn.execute("DELETE FROM analytics")
+
+async def _backfill_daily_active_users(conn: aiosqlite.Connection):
+    cursor = await conn.execute("""
+        SELECT ts / 86400, user_id, SUM(COALESCE(weight, 1)) FROM analytics_events
+        WHERE user_id IS NOT NULL
+        GROUP BY ts / 86400, user_id ORDER BY ts / 86400
+    """)
+    sketch, events, current_day = None, 0, None
+    async for day, user_id, weight in cursor:
+        if day != current_day:
+            if sketch is not None:
+                await conn.execute("INSERT OR REPLACE INTO daily_active_users VALUES (?, ?, ?)",
+                                   (current_day, bytes(sketch), round(events)))
+            sketch, events, current_day = HyperLogLog(), 0, day
+        sketch.add(user_id)
+        events += weight
+    
+    if sketch is not None:
+        await conn.execute("INSERT OR REPLACE INTO daily_active_users VALUES (?, ?, ?)",
+                           (current_day, bytes(sketch), round(events)))
+
+# metric -> (table, timestamp column) for the per-hour and per-day row counts
+ROLLUP_METRICS = {
+    "users": ("users", "created_at"),
+    "contests": ("contests", "created_at"),
+    "participants": ("participants", "joined_at"),
+}
+
+def _epoch(expr: str) -> str:
+    return f"CAST(strftime('%s', COALESCE({expr}, CURRENT_TIMESTAMP)) AS INTEGER)"
+
+def _rollup_bump(metric: str, column: str, row: str, delta: str) -> str:
+    epoch = _epoch(f"{row}.{column}")
+    return f"""
+        INSERT INTO rollup_hourly (metric, hour, count) VALUES ('{metric}', {epoch} / 3600, {delta})
+        ON CONFLICT(metric, hour) DO UPDATE SET count = count + excluded.count;
+        INSERT INTO rollup_daily (metric, day, count) VALUES ('{metric}', {epoch} / 86400, {delta})
+        ON CONFLICT(metric, day) DO UPDATE SET count = count + excluded.count;"""
+
+def _contest_bump(row: str, contests: str, participants: str) -> str:
+    day = f"{_epoch(f'{row}.created_at')} / 86400"
+    return f"""
+        INSERT INTO channel_contests_daily (channel_id, day, contests, participants)
+        VALUES ({row}.channel_id, {day}, {contests}, {participants})
+        ON CONFLICT(channel_id, day) DO UPDATE SET
+            contests = contests + excluded.contests, participants = participants + excluded.participants;
+        INSERT INTO owner_contests_daily (owner_id, day, contests) VALUES ({row}.owner_id, {day}, {contests})
+        ON CONFLICT(owner_id, day) DO UPDATE SET contests = contests + excluded.contests;"""
+
+def _rollup_triggers() -> List[str]:
+    triggers = []
+    for metric, (table, column) in ROLLUP_METRICS.items():
+        triggers.append(f"""CREATE TRIGGER IF NOT EXISTS rollup_{table}_insert AFTER INSERT ON {table} BEGIN
+            {_rollup_bump(metric, column, 'NEW', '1')}
+        END""")
+        triggers.append(f"""CREATE TRIGGER IF NOT EXISTS rollup_{table}_delete AFTER DELETE ON {table} BEGIN
+            {_rollup_bump(metric, column, 'OLD', '-1')}
+        END""")
+    
+    # Contest participants are credited to the day the contest was created, as the report always did
+    triggers += [
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_contests_breakdown_insert AFTER INSERT ON contests BEGIN
+            {_contest_bump('NEW', '1', 'COALESCE(NEW.participant_count, 0)')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_contests_breakdown_delete AFTER DELETE ON contests BEGIN
+            {_contest_bump('OLD', '-1', '-COALESCE(OLD.participant_count, 0)')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS rollup_contests_participant_count
+        AFTER UPDATE OF participant_count ON contests BEGIN
+            {_contest_bump('NEW', '0', 'COALESCE(NEW.participant_count, 0) - COALESCE(OLD.participant_count, 0)')}
+        END""",
+    ]
+    return triggers
+
+async def rebuild_rollups(conn: aiosqlite.Connection):
+    """Recompute every rollup table from the source rows; the triggers keep them current afterwards."""
+    for table in ("rollup_hourly", "rollup_daily", "channel_contests_daily", "owner_contests_daily"):
+        await conn.execute(f"DELETE FROM {table}")
+    
+    for metric, (table, column) in ROLLUP_METRICS.items():
+        await conn.execute(f"""
+            INSERT INTO rollup_hourly (metric, hour, count)
+            SELECT '{metric}', {_epoch(column)} / 3600 AS hour, COUNT(*) FROM {table} GROUP BY hour
+        """)
+    await conn.execute("""
+        INSERT INTO rollup_daily (metric, day, count)
+        SELECT metric, hour / 24 AS day, SUM(count) FROM rollup_hourly GROUP BY metric, day
+    """)
+    
+    await conn.execute(f"""
+        INSERT INTO channel_contests_daily (channel_id, day, contests, participants)
+        SELECT channel_id, {_epoch('created_at')} / 86400 AS day, COUNT(*), COALESCE(SUM(participant_count), 0)
+        FROM contests GROUP BY channel_id, day
+    """)
+    await conn.execute(f"""
+        INSERT INTO owner_contests_daily (owner_id, day, contests)
+        SELECT owner_id, {_epoch('created_at')} / 86400 AS day, COUNT(*) FROM contests GROUP BY owner_id, day
+    """)
+
+def _join_bump(row: str, delta: str) -> str:
+    return f"""
+        INSERT INTO contest_join_buckets (contest_id, hour, count)
+        VALUES ({row}.contest_id, {_epoch(f'{row}.joined_at')} / 3600, {delta})
+        ON CONFLICT(contest_id, hour) DO UPDATE SET count = count + excluded.count;
+        INSERT INTO contest_referrals (contest_id, source, count)
+        SELECT {row}.contest_id, {row}.referral_source, {delta} WHERE {row}.referral_source IS NOT NULL
+        ON CONFLICT(contest_id, source) DO UPDATE SET count = count + excluded.count;"""
+
+CONTEST_HISTOGRAM_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS histogram_participants_insert AFTER INSERT ON participants BEGIN
+        {_join_bump('NEW', '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS histogram_participants_delete AFTER DELETE ON participants BEGIN
+        {_join_bump('OLD', '-1')}
+    END""",
+]
+
+async def rebuild_contest_histograms(conn: aiosqlite.Connection):
+    await conn.execute("DELETE FROM contest_join_buckets")
+    await conn.execute("DELETE FROM contest_referrals")
+    await conn.execute(f"""
+        INSERT INTO contest_join_buckets (contest_id, hour, count)
+        SELECT contest_id, {_epoch('joined_at')} / 3600 AS hour, COUNT(*) FROM participants
+        GROUP BY contest_id, hour
+    """)
+    await conn.execute("""
+        INSERT INTO contest_referrals (contest_id, source, count)
+        SELECT contest_id, referral_source, COUNT(*) FROM participants
+        WHERE referral_source IS NOT NULL GROUP BY contest_id, referral_source
+    """)
+
+def _owner_bump(row: str, sign: str) -> str:
+    def term(expr: str) -> str:
+        return f"{sign}COALESCE({expr}, 0)"
+    
+    return f"""
+        INSERT INTO owner_stats (
+            owner_id, total_contests, active_contests, completed_contests, cancelled_contests,
+            total_views, participant_count_sum, contests_with_participants
+        ) VALUES (
+            {row}.owner_id, {sign}1, {term(f"{row}.status = 'active'")}, {term(f"{row}.status = 'ended'")},
+            {term(f"{row}.status = 'cancelled'")}, {term(f"{row}.view_count")}, {term(f"{row}.participant_count")},
+            {term(f"{row}.participant_count > 0")}
+        ) ON CONFLICT(owner_id) DO UPDATE SET
+            total_contests = total_contests + excluded.total_contests,
+            active_contests = active_contests + excluded.active_contests,
+            completed_contests = completed_contests + excluded.completed_contests,
+            cancelled_contests = cancelled_contests + excluded.cancelled_contests,
+            total_views = total_views + excluded.total_views,
+            participant_count_sum = participant_count_sum + excluded.participant_count_sum,
+            contests_with_participants = contests_with_participants + excluded.contests_with_participants;"""
+
+def _owner_participants(row: str, delta: str) -> str:
+    return f"""
+        UPDATE owner_stats SET total_participants = total_participants + {delta}
+        WHERE owner_id = (SELECT owner_id FROM contests WHERE id = {row}.contest_id);"""
+
+# Installed by the OwnerStats model when create_all builds owner_stats on SQLite
+OWNER_STATS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS owner_stats_contests_insert AFTER INSERT ON contests BEGIN
+        {_owner_bump('NEW', '')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS owner_stats_contests_delete AFTER DELETE ON contests BEGIN
+        {_owner_bump('OLD', '-')}
+        UPDATE owner_stats SET total_participants = total_participants
+            - (SELECT COUNT(*) FROM participants WHERE contest_id = OLD.id)
+        WHERE owner_id = OLD.owner_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS owner_stats_contests_update
+    AFTER UPDATE OF owner_id, status, view_count, participant_count ON contests BEGIN
+        {_owner_bump('OLD', '-')}
+        {_owner_bump('NEW', '')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS owner_stats_participants_insert AFTER INSERT ON participants BEGIN
+        {_owner_participants('NEW', '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS owner_stats_participants_delete AFTER DELETE ON participants BEGIN
+        {_owner_participants('OLD', '-1')}
+    END""",
+]
+
+# Only fills an empty table, so it is also safe to run on every create_all
+OWNER_STATS_BACKFILL = """
+    INSERT INTO owner_stats (
+        owner_id, total_contests, active_contests, completed_contests, cancelled_contests,
+        total_views, participant_count_sum, contests_with_participants, total_participants
+    )
+    SELECT owner_id, COUNT(*),
+        COALESCE(SUM(status = 'active'), 0), COALESCE(SUM(status = 'ended'), 0),
+        COALESCE(SUM(status = 'cancelled'), 0), COALESCE(SUM(view_count), 0),
+        COALESCE(SUM(participant_count), 0), COALESCE(SUM(participant_count > 0), 0),
+        (SELECT COUNT(*) FROM participants p JOIN contests o ON o.id = p.contest_id WHERE o.owner_id = c.owner_id)
+    FROM contests c WHERE NOT EXISTS (SELECT 1 FROM owner_stats) GROUP BY owner_id
+"""
+
+async def rebuild_owner_stats(conn: aiosqlite.Connection):
+    await conn.execute("DELETE FROM owner_stats")
+    await conn.execute(OWNER_STATS_BACKFILL)
+
+# Versions are applied in order and recorded in PRAGMA user_version.
+# Never edit a released entry; append a new version instead.
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "secondary indexes matching the ORM models", [
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+        "CREATE INDEX IF NOT EXISTS idx_users_language_code ON users (language_code)",
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_users_referred_by ON users (referred_by)",
+        "CREATE INDEX IF NOT EXISTS idx_users_premium_until ON users (premium_until) WHERE is_premium = 1",
+        "CREATE INDEX IF NOT EXISTS idx_channels_owner_id ON channels (owner_id, is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_channels_username ON channels (username)",
+        "CREATE INDEX IF NOT EXISTS idx_contests_owner_created ON contests (owner_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_contests_channel_id ON contests (channel_id)",
+        "CREATE INDEX IF NOT EXISTS idx_contests_status_start ON contests (status, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_contests_end_time ON contests (end_time)",
+        "CREATE INDEX IF NOT EXISTS idx_contests_created_at ON contests (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_participants_contest_id ON participants (contest_id)",
+        "CREATE INDEX IF NOT EXISTS idx_participants_user_id ON participants (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_participants_contest_joined ON participants (contest_id, joined_at)",
+        "CREATE INDEX IF NOT EXISTS idx_participants_joined_at ON participants (joined_at)",
+        "CREATE INDEX IF NOT EXISTS idx_winners_contest_position ON winners (contest_id, position)",
+        "CREATE INDEX IF NOT EXISTS idx_winners_user_id ON winners (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_analytics_created_at ON analytics (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_analytics_user_action_time ON analytics (user_id, action, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments (user_id)",
+    ]),
+    (2, "dictionary-encoded analytics events", [
+        """
+        CREATE TABLE IF NOT EXISTS analytics_actions (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS analytics_events (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            user_id INTEGER,
+            action_id INTEGER NOT NULL REFERENCES analytics_actions (id),
+            arg_int INTEGER,
+            arg_text TEXT,
+            chat_id INTEGER,
+            weight REAL,
+            payload TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_analytics_events_ts ON analytics_events (ts)",
+        "CREATE INDEX IF NOT EXISTS idx_analytics_events_user_ts ON analytics_events (user_id, ts)",
+        _compact_analytics,
+        "DROP INDEX IF EXISTS idx_analytics_created_at",
+        "DROP INDEX IF EXISTS idx_analytics_user_action_time",
+    ]),
+    (3, "per-day active user sketches", [
+        """
+        CREATE TABLE IF NOT EXISTS daily_active_users (
+            day INTEGER PRIMARY KEY,
+            sketch BLOB NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        _backfill_daily_active_users,
+    ]),
+    (4, "hourly and daily rollups for the system report", [
+        """
+        CREATE TABLE IF NOT EXISTS rollup_hourly (
+            metric TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, hour)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_daily (
+            metric TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, day)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS channel_contests_daily (
+            channel_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            contests INTEGER NOT NULL DEFAULT 0,
+            participants INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel_id, day)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS owner_contests_daily (
+            owner_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            contests INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (owner_id, day)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_channel_contests_daily_day ON channel_contests_daily (day)",
+        "CREATE INDEX IF NOT EXISTS idx_owner_contests_daily_day ON owner_contests_daily (day)",
+        *_rollup_triggers(),
+        rebuild_rollups,
+    ]),
+    (5, "per-contest join histograms", [
+        """
+        CREATE TABLE IF NOT EXISTS contest_join_buckets (
+            contest_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (contest_id, hour)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS contest_referrals (
+            contest_id INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (contest_id, source)
+        ) WITHOUT ROWID
+        """,
+        *CONTEST_HISTOGRAM_TRIGGERS,
+        rebuild_contest_histograms,
+    ]),
+    (6, "per-owner contest summary", [
+        """
+        CREATE TABLE IF NOT EXISTS owner_stats (
+            owner_id INTEGER PRIMARY KEY,
+            total_contests INTEGER NOT NULL DEFAULT 0,
+            active_contests INTEGER NOT NULL DEFAULT 0,
+            completed_contests INTEGER NOT NULL DEFAULT 0,
+            cancelled_contests INTEGER NOT NULL DEFAULT 0,
+            total_participants INTEGER NOT NULL DEFAULT 0,
+            total_views INTEGER NOT NULL DEFAULT 0,
+            participant_count_sum INTEGER NOT NULL DEFAULT 0,
+            contests_with_participants INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_contests_owner_participants ON contests (owner_id, participant_count)",
+        *OWNER_STATS_TRIGGERS,
+        rebuild_owner_stats,
+    ]),
+    # Only the ORM AnalyticsService reads owner_stats, and it runs on the engine's database, not this one
+    (7, "drop the unread per-owner summary", [
+        "DROP TRIGGER IF EXISTS owner_stats_contests_insert",
+        "DROP TRIGGER IF EXISTS owner_stats_contests_delete",
+        "DROP TRIGGER IF EXISTS owner_stats_contests_update",
+        "DROP TRIGGER IF EXISTS owner_stats_participants_insert",
+        "DROP TRIGGER IF EXISTS owner_stats_participants_delete",
+        "DROP TABLE IF EXISTS owner_stats",
+        "DROP INDEX IF EXISTS idx_contests_owner_participants",
+    ]),
+]
+
+# (name, query, sample params) for the statements on the request path; every one must hit an index
+HOT_QUERIES = [
+    ("get_user", "SELECT * FROM users WHERE id = ?", (1,)),
+    ("iter_active_users", "SELECT * FROM users WHERE is_active = 1 AND is_banned = 0 AND id > ? ORDER BY id LIMIT ?", (0, 1000)),
+    ("get_user_channels", "SELECT * FROM channels WHERE owner_id = ? AND is_active = 1 ORDER BY member_count DESC", (1,)),
+    ("get_contest", "SELECT * FROM contests WHERE id = ?", (1,)),
+    ("get_user_contests", "SELECT * FROM contests WHERE owner_id = ? ORDER BY created_at DESC LIMIT ?", (1, 10)),
+    ("get_active_contests", "SELECT * FROM contests WHERE status IN ('pending', 'active') ORDER BY created_at DESC", ()),
+    ("iter_active_contests", "SELECT * FROM contests WHERE status IN ('pending', 'active') AND id > ? ORDER BY id LIMIT ?", (0, 1000)),
+    ("is_participating", "SELECT 1 FROM participants WHERE contest_id = ? AND user_id = ?", (1, 1)),
+    ("get_participants_count", "SELECT COUNT(*) FROM participants WHERE contest_id = ?", (1,)),
+    ("iter_contest_participant_ids", "SELECT user_id, id FROM participants WHERE contest_id = ? AND id > ? ORDER BY id LIMIT ?", (1, 0, 1000)),
+    ("get_contest_winners", "SELECT u.*, w.position FROM users u JOIN winners w ON u.id = w.user_id WHERE w.contest_id = ? ORDER BY w.position", (1,)),
+    ("user_wins", "SELECT COUNT(*) FROM winners WHERE user_id = ?", (1,)),
+    ("get_user_notifications", "SELECT * FROM notifications WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (1, 10)),
+    ("referrals_count", "SELECT COUNT(*) FROM users WHERE referred_by = ?", (1,)),
+    ("referral_code", "SELECT id FROM users WHERE referral_code = ?", ("code",)),
+    ("premium_expiry", "SELECT id FROM users WHERE is_premium = 1 AND premium_until < datetime('now')", ()),
+    ("recent_analytics", "SELECT COUNT(DISTINCT user_id) FROM analytics_events WHERE ts >= CAST(strftime('%s', 'now', '-1 day') AS INTEGER)", ()),
+    ("daily_active_users", "SELECT day, sketch, events FROM daily_active_users WHERE day >= ?", (0,)),
+    ("rollup_daily", "SELECT day, count FROM rollup_daily WHERE metric = ? AND day BETWEEN ? AND ? ORDER BY day", ("users", 0, 1)),
+    ("top_channels_daily", "SELECT channel_id, SUM(contests) AS n FROM channel_contests_daily WHERE day BETWEEN ? AND ? GROUP BY channel_id ORDER BY n DESC LIMIT 10", (0, 1)),
+    ("contest_join_buckets", "SELECT hour, count FROM contest_join_buckets WHERE contest_id = ?", (1,)),
+    ("contest_referrals", "SELECT source, count FROM contest_referrals WHERE contest_id = ? ORDER BY count DESC", (1,)),
+    ("analytics_export_start", "SELECT MIN(+id) FROM analytics_events WHERE ts >= ?", (0,)),
+    ("analytics_by_action", "SELECT a.name, COUNT(*) FROM analytics_events e JOIN analytics_actions a ON a.id = e.action_id WHERE e.ts >= ? GROUP BY e.action_id", (0,)),
+]
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+async def run_migrations(conn: aiosqlite.Connection) -> int:
+    current = await get_schema_version(conn)
+    
+    for version, name, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        await conn.execute("BEGIN")
+        try:
+            for step in steps:
+                if callable(step):
+                    await step(conn)
+                else:
+                    await conn.execute(step)
+            await conn.execute(f"PRAGMA user_version = {version}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.error(f"Migration {version} ({name}) failed")
+            raise
+        
+        current = version
+        logger.info(f"Applied migration {version}: {name}")
+    
+    return current
+
+async def explain(conn: aiosqlite.Connection, query: str, params: tuple = ()) -> List[str]:
+    cursor = await conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row[3] for row in await cursor.fetchall()]
+
+async def check_query_plans(conn: aiosqlite.Connection) -> List[Tuple[str, List[str]]]:
+    unindexed = []
+    for name, query, params in HOT_QUERIES:
+        plan = await explain(conn, query, params)
+        # "SCAN t" without "USING ... INDEX" is a full table scan
+        if any(step.startswith("SCAN ") and "INDEX" not in step for step in plan):
+            unindexed.append((name, plan))
+    return unindexed
+
+async def _main(db_path: str, rebuild: bool = False):
+    from app.core.database import Database
+    
+    database = Database(db_path, read_pool_size=0)
+    await database.init_db()
+    try:
+        print(f"Schema version: {await get_schema_version(database.connection)}")
+        
+        if rebuild:
+            await database.rebuild_rollups()
+            print("Rebuilt rollup tables")
+        
+        unindexed = await check_query_plans(database.connection)
+        for name, plan in unindexed:
+            print(f"Full scan in {name}: {' | '.join(plan)}")
+        if not unindexed:
+            print(f"All {len(HOT_QUERIES)} hot queries use an index")
+    finally:
+        await database.close()
+
+if __name__ == "__main__":
+    # python -m app.core.migrations [db_path] [--rebuild-rollups]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_main(args[0] if args else "contest_bot.db", rebuild="--rebuild-rollups" in sys.argv))
@@ -0,0 +1,69 @@
+from typing import Any, List, NamedTuple, Optional, Tuple
+from app.core.lru import TTLCache
+from app.core.redis import RedisCache, cache
+from config import settings
+import time
+
+# Sliding-window counter: the previous fixed window is weighted by how much of it still overlaps the sliding one.
+# Every limit is checked before any is charged, so a rejected update consumes nothing.
+# ARGV = cost, then (limit, previous-window weight, ttl ms) per limit; KEYS = (current, previous) per limit.
+# Returns 0 when allowed, otherwise the 1-based index of the first limit that rejected.
+_SLIDING_WINDOW = """
+local cost = tonumber(ARGV[1])
+local count = #KEYS / 2
+for i = 1, count do
+    local base = 2 + (i - 1) * 3
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    if previous * tonumber(ARGV[base + 1]) + current + cost > tonumber(ARGV[base]) then
+        return i
+    end
+end
+for i = 1, count do
+    local base = 2 + (i - 1) * 3
+    redis.call('INCRBY', KEYS[i * 2 - 1], cost)
+    redis.call('PEXPIRE', KEYS[i * 2 - 1], ARGV[base + 2])
+end
+return 0
+"""
+
+class RateLimit(NamedTuple):
+    name: str
+    limit: int
+    window: int
+
+class RateLimiter:
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+        # Used while Redis is unavailable; limits become per-worker instead of global
+        self.local = TTLCache(maxsize=settings.CACHE_FALLBACK_SIZE)
+    
+    async def hit(self, checks: List[Tuple[RateLimit, Any]], cost: int = 1) -> Optional[RateLimit]:
+        """Charge cost against every (limit, identity) pair atomically; return the limit that rejected, if any."""
+        now = time.time()
+        keys, args = [], [cost]
+        for limit, ident in checks:
+            index, elapsed = divmod(now, limit.window)
+            keys += [f"rl:{limit.name}:{ident}:{int(index)}", f"rl:{limit.name}:{ident}:{int(index) - 1}"]
+            args += [limit.limit, 1 - elapsed / limit.window, limit.window * 2000]
+        
+        rejected = await self.cache.run_script(_SLIDING_WINDOW, keys, args)
+        if rejected is None:
+            rejected = self._hit_local(keys, args)
+        return checks[rejected - 1][0] if rejected else None
+    
+    def _hit_local(self, keys: List[str], args: List[Any]) -> int:
+        cost = args[0]
+        for i in range(len(keys) // 2):
+            limit, weight, _ = args[1 + i * 3:4 + i * 3]
+            current = self.local.get(keys[i * 2], 0)
+            previous = self.local.get(keys[i * 2 + 1], 0)
+            if previous * weight + current + cost > limit:
+                return i + 1
+        
+        for i in range(len(keys) // 2):
+            ttl = args[3 + i * 3] / 1000
+            self.local.set(keys[i * 2], self.local.get(keys[i * 2], 0) + cost, ttl=ttl)
+        return 0
+
+limiter = RateLimiter(cache)
@@ -1,64 +1,479 @@
 import redis.asyncio as redis
+from app.core import codec
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.lru import TTLCache
+from app.core.metrics import metrics
 from config import settings
-import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set
+import asyncio
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Deletes the lock only if we still own it, so a slow computation can't release someone else's lock
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def _namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
 class RedisCache:
     def __init__(self):
         self.redis = None
+        self.local = TTLCache(
+            maxsize=settings.CACHE_L1_SIZE, ttl=settings.CACHE_L1_TTL,
+            on_evict=lambda key: metrics.record_cache_eviction(_namespace(key))
+        ) if settings.CACHE_L1_ENABLED else None
+        # Serves reads, writes and counters while the circuit is open so caching and throttling keep working
+        self.fallback = TTLCache(maxsize=settings.CACHE_FALLBACK_SIZE, ttl=3600)
+        self.breaker = CircuitBreaker(
+            "Redis", settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET_TIMEOUT
+        )
+        self._instance_id = uuid.uuid4().hex
+        self._listener = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._scripts: Dict[str, Any] = {}
+        # Invalidations Redis missed while the circuit was open; replayed before it is used again
+        self._pending_deletes: Set[str] = set()
+        self._pending_tags: Set[str] = set()
     
     async def init_redis(self):
+        pool = redis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_SIZE,
+            socket_timeout=settings.REDIS_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_TIMEOUT
+        )
+        self.redis = redis.Redis(connection_pool=pool)
         try:
-            self.redis = redis.from_url(settings.REDIS_URL)
             await self.redis.ping()
             logger.info("Redis connected successfully")
         except Exception as e:
+            # Keep the client: the breaker probes it again after the reset timeout
             logger.warning(f"Redis connection failed: {e}")
-            self.redis = None
+            self.breaker.trip()
+        
+        if self.local is not None:
+            self._listener = asyncio.create_task(self._listen_invalidations())
+    
+    async def _available(self) -> bool:
+        if self.redis is None or not self.breaker.allow():
+            return False
+        if self.breaker.state == CircuitBreaker.CLOSED:
+            return True
+        # This call is the half-open probe: stale entries must be gone before Redis serves anything
+        return await self._replay_invalidations()
+    
+    async def _replay_invalidations(self) -> bool:
+        keys = list(self._pending_deletes)
+        tag_keys = list(self._pending_tags)
+        if not keys and not tag_keys:
+            return True
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.delete(*keys)
+                for tag_key in tag_keys:
+                    pipe.incr(tag_key)
+                if self.local is not None:
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message(keys + tag_keys))
+                await pipe.execute()
+        except Exception as e:
+            self._failed("replay invalidations", e)
+            return False
+        
+        self._pending_deletes.difference_update(keys)
+        self._pending_tags.difference_update(tag_keys)
+        logger.info(f"Replayed {len(keys)} deletes and {len(tag_keys)} tag bumps missed during the Redis outage")
+        return True
+    
+    def _succeeded(self):
+        if self.breaker.record_success():
+            # Anything cached locally during the outage may have missed invalidations
+            self.fallback.clear()
+            if self.local is not None:
+                self.local.clear()
+    
+    def _failed(self, operation: str, error: Exception):
+        self.breaker.record_failure()
+        logger.error(f"Redis {operation} error: {error}")
     
     async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
         if self.redis:
-            await self.redis.close()
+            await self.redis.close(close_connection_pool=True)
     
-    async def get(self, key: str):
-        if not self.redis:
+    async def _listen_invalidations(self):
+        while True:
+            # Don't use up the breaker's half-open probe; regular calls re-close the circuit
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                await asyncio.sleep(1)
+                continue
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    sender, _, keys = message["data"].decode().partition(":")
+                    if sender != self._instance_id:
+                        for key in keys.split("\n"):
+                            self.local.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries written while we were disconnected may be stale on this worker
+                self._failed("invalidation listener", e)
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+    
+    def _invalidation_message(self, keys: List[str]) -> str:
+        return f"{self._instance_id}:" + "\n".join(keys)
+    
+    async def _publish_invalidation(self, key: str):
+        if self.local is None:
+            return
+        try:
+            await self.redis.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message([key]))
+        except Exception as e:
+            self._failed("publish", e)
+    
+    async def _tag_generations(self, tags: List[str]) -> List[int]:
+        tag_keys = [f"tag:{tag}" for tag in tags]
+        found = await self.get_many(tag_keys)
+        if self.local is not None:
+            # Remember never-invalidated tags too, otherwise every lookup would go to Redis for them
+            for tag_key in tag_keys:
+                if tag_key not in found:
+                    self.local.set(tag_key, 0)
+        return [int(found.get(tag_key, 0)) for tag_key in tag_keys]
+    
+    async def _tagged_key(self, key: str, tags: Iterable[str]) -> str:
+        """Append the current generation of every tag, so bumping a tag orphans all keys derived from it."""
+        tags = list(tags)
+        if not tags:
+            return key
+        generations = await self._tag_generations(tags)
+        return f"{key}|{'.'.join(map(str, generations))}"
+    
+    async def invalidate_tag(self, name: str, ident: Any = None):
+        await self.invalidate_tags([name if ident is None else f"{name}:{ident}"])
+    
+    async def invalidate_tags(self, tags: Iterable[str]):
+        tag_keys = [f"tag:{tag}" for tag in tags]
+        if not await self._available():
+            for tag_key in tag_keys:
+                current = self.fallback.get(tag_key) or (self.local.get(tag_key) if self.local is not None else 0)
+                self.fallback.set(tag_key, (current or 0) + 1)
+                if self.local is not None:
+                    self.local.delete(tag_key)
+            self._pending_tags.update(tag_keys)
+            return False
+        
+        if self.local is not None:
+            for tag_key in tag_keys:
+                self.local.delete(tag_key)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for tag_key in tag_keys:
+                    pipe.incr(tag_key)
+                if self.local is not None:
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message(tag_keys))
+                await pipe.execute()
+            self._succeeded()
+            return True
+        except Exception as e:
+            self._failed("invalidate_tags", e)
+            self._pending_tags.update(tag_keys)
+            return False
+    
+    async def get(self, key: str, tags: Iterable[str] = ()):
+        key = await self._tagged_key(key, tags)
+        if self.local is not None:
+            value = self.local.get(key)
+            metrics.record_cache_lookup(_namespace(key), "local", value is not None)
+            if value is not None:
+                return value
+        
+        if not await self._available():
+            return self.fallback.get(key)
+        try:
+            payload = await self.redis.get(key)
+            self._succeeded()
+        except Exception as e:
+            self._failed("get", e)
+            return self.fallback.get(key)
+        
+        metrics.record_cache_lookup(_namespace(key), "redis", payload is not None)
+        if not payload:
             return None
         try:
-            value = await self.redis.get(key)
-            return json.loads(value) if value else None
+            value = codec.decode(payload)
         except Exception as e:
-            logger.error(f"Redis get error: {e}")
+            logger.error(f"Cache decode error for {key}: {e}")
             return None
+        
+        if self.local is not None:
+            self.local.set(key, value)
+        return value
     
-    async def set(self, key: str, value, expire: int = 3600):
-        if not self.redis:
+    async def set(self, key: str, value, expire: int = 3600, tags: Iterable[str] = ()):
+        key = await self._tagged_key(key, tags)
+        try:
+            payload = codec.encode(value)
+        except Exception as e:
+            logger.error(f"Cache encode error for {key}: {e}")
+            return False
+        
+        if self.local is not None:
+            # Keep the decoded snapshot so local hits look exactly like Redis hits
+            self.local.set(key, codec.decode(payload), ttl=min(expire, self.local.ttl))
+        
+        if not await self._available():
+            self.fallback.set(key, codec.decode(payload), ttl=expire)
             return False
         try:
-            await self.redis.set(key, json.dumps(value), ex=expire)
-            return True
+            await self.redis.set(key, payload, ex=expire)
+            self._succeeded()
         except Exception as e:
-            logger.error(f"Redis set error: {e}")
+            self._failed("set", e)
+            self.fallback.set(key, codec.decode(payload), ttl=expire)
             return False
+        
+        await self._publish_invalidation(key)
+        return True
     
     async def delete(self, key: str):
-        if not self.redis:
+        if self.local is not None:
+            self.local.delete(key)
+        self.fallback.delete(key)
+        
+        if not await self._available():
+            self._pending_deletes.add(key)
             return False
         try:
             await self.redis.delete(key)
+            self._succeeded()
+        except Exception as e:
+            self._failed("delete", e)
+            self._pending_deletes.add(key)
+            return False
+        
+        await self._publish_invalidation(key)
+        return True
+    
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key) if self.local is not None else None
+            if self.local is not None:
+                metrics.record_cache_lookup(_namespace(key), "local", value is not None)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        
+        if not missing:
+            return found
+        if not await self._available():
+            return self._get_many_fallback(missing, found)
+        try:
+            payloads = await self.redis.mget(missing)
+            self._succeeded()
+        except Exception as e:
+            self._failed("mget", e)
+            return self._get_many_fallback(missing, found)
+        
+        for key, payload in zip(missing, payloads):
+            metrics.record_cache_lookup(_namespace(key), "redis", payload is not None)
+            if not payload:
+                continue
+            try:
+                value = codec.decode(payload)
+            except Exception as e:
+                logger.error(f"Cache decode error for {key}: {e}")
+                continue
+            if self.local is not None:
+                self.local.set(key, value)
+            found[key] = value
+        
+        return found
+    
+    def _get_many_fallback(self, keys: List[str], found: Dict[str, Any]) -> Dict[str, Any]:
+        for key in keys:
+            value = self.fallback.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+    
+    async def set_many(self, mapping: Dict[str, Any], expire: int = 3600):
+        payloads = {}
+        for key, value in mapping.items():
+            try:
+                payloads[key] = codec.encode(value)
+            except Exception as e:
+                logger.error(f"Cache encode error for {key}: {e}")
+        
+        if self.local is not None:
+            for key, payload in payloads.items():
+                self.local.set(key, codec.decode(payload), ttl=min(expire, self.local.ttl))
+        
+        if not payloads:
+            return False
+        if not await self._available():
+            for key, payload in payloads.items():
+                self.fallback.set(key, codec.decode(payload), ttl=expire)
+            return False
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, payload in payloads.items():
+                    pipe.set(key, payload, ex=expire)
+                if self.local is not None:
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message(list(payloads)))
+                await pipe.execute()
+            self._succeeded()
+            return len(payloads) == len(mapping)
+        except Exception as e:
+            self._failed("set_many", e)
+            for key, payload in payloads.items():
+                self.fallback.set(key, codec.decode(payload), ttl=expire)
+            return False
+    
+    async def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        for key in keys:
+            if self.local is not None:
+                self.local.delete(key)
+            self.fallback.delete(key)
+        
+        if not keys:
+            return False
+        if not await self._available():
+            self._pending_deletes.update(keys)
+            return False
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                if self.local is not None:
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message(keys))
+                await pipe.execute()
+            self._succeeded()
             return True
         except Exception as e:
-            logger.error(f"Redis delete error: {e}")
+            self._failed("delete_many", e)
+            self._pending_deletes.update(keys)
             return False
     
-    async def increment(self, key: str, amount: int = 1):
-        if not self.redis:
-            return 0
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             ttl: int = 300, stale_ttl: int = 60, lock_timeout: float = 10,
+                             tags: Iterable[str] = ()):
+        """Return the cached value for key, computing it at most once across callers and workers.
+        
+        For stale_ttl seconds after the value goes stale it is still served while a
+        single background task refreshes it.
+        """
+        key = await self._tagged_key(key, tags)
+        entry = await self.get(key)
+        # Values written by plain set() under the same key predate the envelope; treat them as a miss
+        if isinstance(entry, dict) and "fresh_until" in entry:
+            if entry["fresh_until"] > time.time():
+                return entry["value"]
+            self._single_flight(key, compute, ttl, stale_ttl, lock_timeout, stale=entry)
+            return entry["value"]
+        
+        return await asyncio.shield(self._single_flight(key, compute, ttl, stale_ttl, lock_timeout))
+    
+    def _single_flight(self, key: str, compute, ttl: int, stale_ttl: int, lock_timeout: float, stale=None) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(key, compute, ttl, stale_ttl, lock_timeout, stale))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            if stale is not None:
+                future.add_done_callback(self._log_refresh_error)
+        return future
+    
+    @staticmethod
+    def _log_refresh_error(future: asyncio.Future):
+        # Background refreshes have no awaiter, so failures would otherwise go unnoticed
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Cache refresh error: {future.exception()}")
+    
+    async def _refresh(self, key: str, compute, ttl: int, stale_ttl: int, lock_timeout: float, stale):
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        locked = False
+        
+        if await self._available():
+            try:
+                locked = bool(await self.redis.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)))
+                contended = not locked
+                self._succeeded()
+            except Exception as e:
+                self._failed("lock", e)
+                contended = False
+            
+            if contended:
+                if stale is not None:
+                    return stale["value"]
+                # Another worker is computing; wait for its result instead of piling on
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    entry = await self.get(key)
+                    if isinstance(entry, dict) and "fresh_until" in entry:
+                        return entry["value"]
+        
+        try:
+            value = await compute()
+            await self.set(key, {"value": value, "fresh_until": time.time() + ttl}, expire=ttl + stale_ttl)
+            return value
+        finally:
+            if locked:
+                try:
+                    await self.redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+                except Exception as e:
+                    self._failed("unlock", e)
+    
+    async def run_script(self, script: str, keys: List[str], args: List[Any]):
+        """Run a Lua script via EVALSHA; returns None when Redis is unavailable so callers can fall back."""
+        if not await self._available():
+            return None
+        if script not in self._scripts:
+            self._scripts[script] = self.redis.register_script(script)
         try:
-            return await self.redis.incrby(key, amount)
+            result = await self._scripts[script](keys=keys, args=args)
+            self._succeeded()
+            return result
         except Exception as e:
-            logger.error(f"Redis increment error: {e}")
-            return 0
+            self._failed("script", e)
+            return None
+    
+    async def increment(self, key: str, amount: int = 1):
+        if await self._available():
+            try:
+                value = await self.redis.incrby(key, amount)
+                self._succeeded()
+                return value
+            except Exception as e:
+                self._failed("increment", e)
+        
+        value = (self.fallback.get(key) or 0) + amount
+        self.fallback.set(key, value)
+        return value
 
 cache = RedisCache()
+redis_manager = cache
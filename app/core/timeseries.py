@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+MINUTE = 60
+HOUR = 3600
+
+_EPOCH = datetime(1970, 1, 1)
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    step = timedelta(seconds=seconds)
+    return _EPOCH + (ts - _EPOCH) // step * step
+
+class Aggregate:
+    """min/max/avg/last over a bucket; merging two aggregates gives the aggregate of the union."""
+    __slots__ = ("min", "max", "total", "count", "last", "last_at")
+    
+    def __init__(self):
+        self.min = self.max = self.last = None
+        self.last_at: Optional[datetime] = None
+        self.total = 0.0
+        self.count = 0
+    
+    def add(self, value: float, at: datetime):
+        self.merge(value, value, value, 1, value, at)
+    
+    def merge(self, min_value: float, max_value: float, avg_value: float, count: int,
+              last_value: float, last_at: datetime):
+        self.min = min_value if self.min is None else min(self.min, min_value)
+        self.max = max_value if self.max is None else max(self.max, max_value)
+        self.total += avg_value * count
+        self.count += count
+        if self.last_at is None or last_at >= self.last_at:
+            self.last, self.last_at = last_value, last_at
+    
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def to_dict(self, start: datetime) -> Dict[str, Any]:
+        return {
+            "timestamp": start, "min": self.min, "max": self.max, "avg": self.avg,
+            "last": self.last, "count": self.count, "value": self.avg
+        }
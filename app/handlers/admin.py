@@ -1,6 +1,6 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from app.core.database import db
@@ -8,6 +8,7 @@ from app.keyboards.inline import admin_panel_keyboard, back_to_menu_keyboard
 from app.locales.translations import get_text
 from app.services.broadcast_service import BroadcastService
 from app.services.analytics_service import AnalyticsService
+from app.services.export_service import ExportService, FORMATS
 from config import settings
 import asyncio
 import logging
@@ -19,13 +20,10 @@ class BroadcastState(StatesGroup):
     waiting_for_message = State()
 
 @router.message(Command("admin"))
-async def admin_command(message: Message):
+async def admin_command(message: Message, lang: str):
     if message.from_user.id not in settings.ADMIN_IDS:
         return
     
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     stats = await db.get_statistics()
     
     text = "👨‍💻 *Admin Panel*\n\n"
@@ -44,15 +42,41 @@ async def admin_command(message: Message):
         parse_mode="Markdown"
     )
 
+@router.message(Command("reconcile_stats"))
+async def reconcile_stats_command(message: Message):
+    if message.from_user.id not in settings.ADMIN_IDS:
+        return
+    
+    stats = await db.reconcile_statistics()
+    
+    text = "🔄 *Statistika qayta hisoblandi:*\n\n"
+    for name, value in stats.items():
+        text += f"• {name}: {value:,}\n"
+    
+    await message.answer(text, parse_mode="Markdown")
+
+@router.message(Command("export_analytics"))
+async def export_analytics_command(message: Message, command: CommandObject):
+    if message.from_user.id not in settings.ADMIN_IDS:
+        return
+    
+    # /export_analytics [days] [csv|ndjson]
+    args = (command.args or "").split()
+    days = int(args[0]) if args and args[0].isdigit() else 7
+    fmt = args[1] if len(args) > 1 and args[1] in FORMATS else "csv"
+    
+    try:
+        await ExportService.send(message, "analytics", days, fmt)
+    except Exception as e:
+        logger.error(f"Analytics export failed: {e}")
+        await message.answer("❌ Eksport qilib bo'lmadi")
+
 @router.callback_query(F.data == "admin_broadcast")
-async def admin_broadcast_callback(callback: CallbackQuery, state: FSMContext):
+async def admin_broadcast_callback(callback: CallbackQuery, state: FSMContext, lang: str):
     if callback.from_user.id not in settings.ADMIN_IDS:
         await callback.answer("Ruxsat yo'q", show_alert=True)
         return
     
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     await callback.message.edit_text(
         "📢 *Reklama xabarini yuboring:*\n\nMatn, rasm yoki video yuborishingiz mumkin." if lang == "uz" else "📢 *Отправьте рекламное сообщение:*\n\nВы можете отправить текст, изображение или видео.",
         reply_markup=back_to_menu_keyboard(lang),
@@ -61,13 +85,10 @@ async def admin_broadcast_callback(callback: CallbackQuery, state: FSMContext):
     await state.set_state(BroadcastState.waiting_for_message)
 
 @router.message(BroadcastState.waiting_for_message)
-async def process_broadcast_message(message: Message, state: FSMContext):
+async def process_broadcast_message(message: Message, state: FSMContext, lang: str):
     if message.from_user.id not in settings.ADMIN_IDS:
         return
     
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     await message.answer("📤 Reklama yuborilmoqda..." if lang == "uz" else "📤 Отправка рекламы...")
     
     message_data = {}
@@ -100,14 +121,11 @@ async def process_broadcast_message(message: Message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "admin_stats")
-async def admin_stats_callback(callback: CallbackQuery):
+async def admin_stats_callback(callback: CallbackQuery, lang: str):
     if callback.from_user.id not in settings.ADMIN_IDS:
         await callback.answer("Ruxsat yo'q", show_alert=True)
         return
     
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     stats = await db.get_statistics()
     engagement = await AnalyticsService.get_user_engagement_metrics()
     
@@ -134,14 +152,11 @@ async def admin_stats_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "admin_analytics")
-async def admin_analytics_callback(callback: CallbackQuery):
+async def admin_analytics_callback(callback: CallbackQuery, lang: str):
     if callback.from_user.id not in settings.ADMIN_IDS:
         await callback.answer("Ruxsat yo'q", show_alert=True)
         return
     
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     analytics = await AnalyticsService.get_system_analytics(days=7)
     
     text = "📈 *7 kunlik analitika:*\n\n" if lang == "uz" else "📈 *Аналитика за 7 дней:*\n\n"
@@ -170,28 +185,26 @@ async def admin_analytics_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "admin_users")
-async def admin_users_callback(callback: CallbackQuery):
+async def admin_users_callback(callback: CallbackQuery, lang: str):
     if callback.from_user.id not in settings.ADMIN_IDS:
         await callback.answer("Ruxsat yo'q", show_alert=True)
         return
     
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
-    cursor = await db.connection.execute("""
-        SELECT COUNT(*) as count, language_code 
-        FROM users 
-        GROUP BY language_code
-    """)
-    lang_stats = await cursor.fetchall()
-    
-    cursor = await db.connection.execute("""
-        SELECT first_name, username, created_at 
-        FROM users 
-        ORDER BY created_at DESC 
-        LIMIT 5
-    """)
-    recent_users = await cursor.fetchall()
+    async with db.reader() as conn:
+        cursor = await conn.execute("""
+            SELECT COUNT(*) as count, language_code 
+            FROM users 
+            GROUP BY language_code
+        """)
+        lang_stats = await cursor.fetchall()
+        
+        cursor = await conn.execute("""
+            SELECT first_name, username, created_at 
+            FROM users 
+            ORDER BY created_at DESC 
+            LIMIT 5
+        """)
+        recent_users = await cursor.fetchall()
     
     text = "👥 *Foydalanuvchilar boshqaruvi:*\n\n" if lang == "uz" else "👥 *Управление пользователями:*\n\n"
     
@@ -213,29 +226,27 @@ async def admin_users_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "admin_contests")
-async def admin_contests_callback(callback: CallbackQuery):
+async def admin_contests_callback(callback: CallbackQuery, lang: str):
     if callback.from_user.id not in settings.ADMIN_IDS:
         await callback.answer("Ruxsat yo'q", show_alert=True)
         return
     
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
-    cursor = await db.connection.execute("""
-        SELECT status, COUNT(*) as count 
-        FROM contests 
-        GROUP BY status
-    """)
-    status_stats = await cursor.fetchall()
-    
-    cursor = await db.connection.execute("""
-        SELECT c.title, c.participant_count, u.first_name 
-        FROM contests c
-        JOIN users u ON c.owner_id = u.id
-        ORDER BY c.participant_count DESC 
-        LIMIT 5
-    """)
-    top_contests = await cursor.fetchall()
+    async with db.reader() as conn:
+        cursor = await conn.execute("""
+            SELECT status, COUNT(*) as count 
+            FROM contests 
+            GROUP BY status
+        """)
+        status_stats = await cursor.fetchall()
+        
+        cursor = await conn.execute("""
+            SELECT c.title, c.participant_count, u.first_name 
+            FROM contests c
+            JOIN users u ON c.owner_id = u.id
+            ORDER BY c.participant_count DESC 
+            LIMIT 5
+        """)
+        top_contests = await cursor.fetchall()
     
     text = "🏆 *Konkurslar boshqaruvi:*\n\n" if lang == "uz" else "🏆 *Управление конкурсами:*\n\n"
     
@@ -1,13 +1,15 @@
 import asyncio
 from datetime import datetime, timedelta
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from app.core.database import db
+from app.core.database import db, JoinStatus
 from app.keyboards.inline import *
 from app.locales.translations import get_text
 from app.services.contest_service import ContestService
+from app.services.export_service import ExportService, FORMATS
 from app.services.user_service import UserService
 from config import settings
 import logging
@@ -35,10 +37,7 @@ async def check_subscription(user_id: int, channel_id: int, bot) -> bool:
         return False
 
 @router.callback_query(F.data == "create_contest")
-async def create_contest_callback(callback: CallbackQuery, state: FSMContext):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def create_contest_callback(callback: CallbackQuery, state: FSMContext, lang: str):
     is_premium = await UserService.check_premium_status(callback.from_user.id)
     
     if not is_premium:
@@ -59,10 +58,7 @@ async def create_contest_callback(callback: CallbackQuery, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_channel)
 
 @router.message(ContestCreation.waiting_for_channel)
-async def process_channel(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_channel(message: Message, state: FSMContext, lang: str):
     try:
         channel_input = message.text.strip()
         
@@ -118,10 +114,7 @@ async def process_channel(message: Message, state: FSMContext):
         )
 
 @router.message(ContestCreation.waiting_for_image, F.photo)
-async def process_image(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_image(message: Message, state: FSMContext, lang: str):
     await state.update_data(image_file_id=message.photo[-1].file_id)
     await message.answer(
         get_text("send_description", lang),
@@ -131,10 +124,7 @@ async def process_image(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_description)
 
 @router.message(ContestCreation.waiting_for_image)
-async def process_no_image(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_no_image(message: Message, state: FSMContext, lang: str):
     await state.update_data(image_file_id=None)
     await message.answer(
         get_text("send_description", lang),
@@ -144,10 +134,7 @@ async def process_no_image(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_description)
 
 @router.message(ContestCreation.waiting_for_description)
-async def process_description(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_description(message: Message, state: FSMContext, lang: str):
     if len(message.text) > 1000:
         await message.answer(
             "Tavsif juda uzun! 1000 belgidan kam bo'lishi kerak." if lang == "uz" else "Описание слишком длинное! Должно быть менее 1000 символов.",
@@ -164,10 +151,7 @@ async def process_description(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_prize_description)
 
 @router.message(ContestCreation.waiting_for_prize_description)
-async def process_prize_description(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_prize_description(message: Message, state: FSMContext, lang: str):
     await state.update_data(prize_description=message.text)
     await message.answer(
         get_text("send_requirements", lang),
@@ -177,10 +161,7 @@ async def process_prize_description(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_requirements)
 
 @router.message(ContestCreation.waiting_for_requirements)
-async def process_requirements(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_requirements(message: Message, state: FSMContext, lang: str):
     await state.update_data(requirements=message.text)
     await message.answer(
         get_text("participate_button_text", lang),
@@ -190,10 +171,7 @@ async def process_requirements(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_button_text)
 
 @router.message(ContestCreation.waiting_for_button_text)
-async def process_button_text(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_button_text(message: Message, state: FSMContext, lang: str):
     if len(message.text) > 50:
         await message.answer(
             "Tugma matni juda uzun!" if lang == "uz" else "Текст кнопки слишком длинный!",
@@ -210,10 +188,7 @@ async def process_button_text(message: Message, state: FSMContext):
     await state.set_state(ContestCreation.waiting_for_winners_count)
 
 @router.message(ContestCreation.waiting_for_winners_count)
-async def process_winners_count(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_winners_count(message: Message, state: FSMContext, lang: str):
     try:
         winners_count = int(message.text)
         if winners_count < 1 or winners_count > settings.MAX_WINNERS_COUNT:
@@ -234,10 +209,7 @@ async def process_winners_count(message: Message, state: FSMContext):
         )
 
 @router.message(ContestCreation.waiting_for_start_time)
-async def process_start_time(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_start_time(message: Message, state: FSMContext, lang: str):
     try:
         start_time = datetime.strptime(message.text, "%Y-%m-%d %H:%M")
         
@@ -270,10 +242,7 @@ async def process_start_time(message: Message, state: FSMContext):
         )
 
 @router.message(ContestCreation.waiting_for_end_time)
-async def process_end_time(message: Message, state: FSMContext):
-    user = await db.get_user(message.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_end_time(message: Message, state: FSMContext, lang: str):
     try:
         contest_data = await state.get_data()
         start_time = datetime.strptime(contest_data["start_time"], "%Y-%m-%d %H:%M:%S")
@@ -317,10 +286,7 @@ async def process_end_time(message: Message, state: FSMContext):
         )
 
 @router.callback_query(F.data.startswith("select_channel:"), ContestCreation.waiting_for_channel_selection)
-async def process_channel_selection(callback: CallbackQuery, state: FSMContext):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def process_channel_selection(callback: CallbackQuery, state: FSMContext, lang: str):
     channel_id = int(callback.data.split(":")[1])
     contest_data = await state.get_data()
     
@@ -347,11 +313,8 @@ async def process_channel_selection(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "cancel_creation")
-async def cancel_creation_callback(callback: CallbackQuery, state: FSMContext):
+async def cancel_creation_callback(callback: CallbackQuery, state: FSMContext, lang: str):
     await state.clear()
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     is_premium = await UserService.check_premium_status(callback.from_user.id)
     
     await callback.message.edit_text(
@@ -360,10 +323,7 @@ async def cancel_creation_callback(callback: CallbackQuery, state: FSMContext):
     )
 
 @router.callback_query(F.data.startswith("join_contest:"))
-async def join_contest_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def join_contest_callback(callback: CallbackQuery, lang: str):
     contest_id = int(callback.data.split(":")[1])
     
     contest = await ContestService.get_contest_with_cache(contest_id)
@@ -371,23 +331,16 @@ async def join_contest_callback(callback: CallbackQuery):
         await callback.answer(get_text("contest_ended", lang), show_alert=True)
         return
     
-    if contest['max_participants']:
-        current_participants = await db.get_participants_count(contest_id)
-        if current_participants >= contest['max_participants']:
-            await callback.answer("Konkurs to'ldi!" if lang == "uz" else "Конкурс заполнен!", show_alert=True)
-            return
-    
     if settings.SPONSOR_CHANNEL_ID:
         if not await check_subscription(callback.from_user.id, settings.SPONSOR_CHANNEL_ID, callback.bot):
             await callback.answer(get_text("not_subscribed", lang), show_alert=True)
             return
     
-    success = await ContestService.join_contest(contest_id, callback.from_user.id)
+    result = await ContestService.join_contest(contest_id, callback.from_user.id)
     
-    if success:
-        participants_count = await db.get_participants_count(contest_id)
+    if result.status is JoinStatus.JOINED:
         new_keyboard = contest_participation_keyboard(
-            contest_id, participants_count, contest['participate_button_text']
+            contest_id, result.participant_count, contest['participate_button_text']
         )
         
         try:
@@ -396,14 +349,15 @@ async def join_contest_callback(callback: CallbackQuery):
             pass
         
         await callback.answer(get_text("participation_confirmed", lang), show_alert=True)
+    elif result.status is JoinStatus.FULL:
+        await callback.answer("Konkurs to'ldi!" if lang == "uz" else "Конкурс заполнен!", show_alert=True)
+    elif result.status is JoinStatus.INACTIVE:
+        await callback.answer(get_text("contest_ended", lang), show_alert=True)
     else:
         await callback.answer(get_text("already_participating", lang), show_alert=True)
 
 @router.callback_query(F.data == "my_contests")
-async def my_contests_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def my_contests_callback(callback: CallbackQuery, lang: str):
     contests = await db.get_user_contests(callback.from_user.id, limit=10)
     
     if not contests:
@@ -431,12 +385,35 @@ async def my_contests_callback(callback: CallbackQuery):
         parse_mode="Markdown"
     )
 
+@router.message(Command("export"))
+async def export_command(message: Message, command: CommandObject, lang: str):
+    # /export <contest_id> [participants|winners] [csv|ndjson]
+    args = (command.args or "").split()
+    if not args or not args[0].isdigit():
+        await message.answer(
+            "Foydalanish: /export <konkurs_id> [participants|winners] [csv|ndjson]" if lang == "uz"
+            else "Использование: /export <id_конкурса> [participants|winners] [csv|ndjson]"
+        )
+        return
+    
+    contest_id = int(args[0])
+    kind = args[1] if len(args) > 1 and args[1] in ("participants", "winners") else "participants"
+    fmt = args[2] if len(args) > 2 and args[2] in FORMATS else "csv"
+    
+    contest = await db.get_contest(contest_id)
+    if not contest or (contest['owner_id'] != message.from_user.id and message.from_user.id not in settings.ADMIN_IDS):
+        await message.answer("Konkurs topilmadi!" if lang == "uz" else "Конкурс не найден!")
+        return
+    
+    try:
+        await ExportService.send(message, kind, contest_id, fmt)
+    except Exception as e:
+        logger.error(f"Export of contest {contest_id} {kind} failed: {e}")
+        await message.answer("❌ Eksport qilib bo'lmadi" if lang == "uz" else "❌ Не удалось выполнить экспорт")
+
 @router.callback_query(F.data.startswith("contest_stats:"))
-async def contest_stats_callback(callback: CallbackQuery):
+async def contest_stats_callback(callback: CallbackQuery, lang: str):
     contest_id = int(callback.data.split(":")[1])
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     stats = await ContestService.get_contest_statistics(contest_id)
     
     if not stats:
@@ -12,10 +12,7 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 @router.callback_query(F.data == "analytics")
-async def analytics_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def analytics_callback(callback: CallbackQuery, lang: str):
     analytics = await UserService.get_user_analytics(callback.from_user.id)
     
     text = "📊 *Sizning statistikangiz:*\n\n" if lang == "uz" else "📊 *Ваша статистика:*\n\n"
@@ -32,10 +29,7 @@ async def analytics_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "my_channels")
-async def my_channels_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def my_channels_callback(callback: CallbackQuery, lang: str):
     channels = await db.get_user_channels(callback.from_user.id)
     
     if not channels:
@@ -57,10 +51,7 @@ async def my_channels_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "referral")
-async def referral_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def referral_callback(callback: CallbackQuery, lang: str):
     referral_info = await UserService.get_referral_info(callback.from_user.id)
     
     text = get_text("referral_info", lang, 
@@ -75,10 +66,7 @@ async def referral_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "notifications")
-async def notifications_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def notifications_callback(callback: CallbackQuery, lang: str):
     notifications = await db.get_user_notifications(callback.from_user.id)
     
     if not notifications:
@@ -99,10 +87,7 @@ async def notifications_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "settings")
-async def settings_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def settings_callback(callback: CallbackQuery, user: dict, lang: str):
     is_premium = await UserService.check_premium_status(callback.from_user.id)
     
     text = "⚙️ *Sozlamalar*\n\n" if lang == "uz" else "⚙️ *Настройки*\n\n"
@@ -125,10 +110,7 @@ async def settings_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "premium")
-async def premium_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def premium_callback(callback: CallbackQuery, lang: str):
     text = "⭐ *Premium Imkoniyatlar*\n\n" if lang == "uz" else "⭐ *Премиум возможности*\n\n"
     text += "🚀 Qo'shimcha funksiyalar:\n" if lang == "uz" else "🚀 Дополнительные функции:\n"
     text += "• Cheksiz konkurslar\n" if lang == "uz" else "• Неограниченные конкурсы\n"
@@ -146,10 +128,7 @@ async def premium_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "premium_features")
-async def premium_features_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def premium_features_callback(callback: CallbackQuery, lang: str):
     text = "✨ *Premium Funksiyalar Batafsil*\n\n" if lang == "uz" else "✨ *Премиум функции подробно*\n\n"
     
     features = [
@@ -176,10 +155,7 @@ async def premium_features_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "buy_premium")
-async def buy_premium_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def buy_premium_callback(callback: CallbackQuery, lang: str):
     text = "💳 *Premium sotib olish*\n\n" if lang == "uz" else "💳 *Покупка Premium*\n\n"
     text += "To'lov usullari:\n\n" if lang == "uz" else "Способы оплаты:\n\n"
     text += "💳 Click/Payme\n"
@@ -195,10 +171,7 @@ async def buy_premium_callback(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "support")
-async def support_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def support_callback(callback: CallbackQuery, lang: str):
     text = "🛟 *Yordam*\n\n" if lang == "uz" else "🛟 *Поддержка*\n\n"
     text += "Savollaringiz bo'lsa, biz bilan bog'laning:\n\n" if lang == "uz" else "По всем вопросам обращайтесь к нам:\n\n"
     text += "📧 Email: support@konkursbot.uz\n"
@@ -2,7 +2,6 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
-from app.core.database import db
 from app.keyboards.inline import main_menu_keyboard, subscription_check_keyboard
 from app.locales.translations import get_text
 from app.services.user_service import UserService
@@ -30,7 +29,7 @@ async def start_command(message: Message, state: FSMContext):
         if start_param.startswith('ref_'):
             referral_code = start_param[4:]
     
-    user = await db.create_or_update_user(
+    user = await UserService.create_or_update_user(
         user_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
@@ -72,10 +71,7 @@ async def start_command(message: Message, state: FSMContext):
     )
 
 @router.callback_query(F.data == "check_subscription")
-async def check_subscription_callback(callback: CallbackQuery):
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
+async def check_subscription_callback(callback: CallbackQuery, lang: str):
     if settings.SPONSOR_CHANNEL_ID:
         is_subscribed = await check_subscription(
             callback.from_user.id, settings.SPONSOR_CHANNEL_ID, callback.bot
@@ -101,11 +97,8 @@ async def check_subscription_callback(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "main_menu")
-async def main_menu_callback(callback: CallbackQuery, state: FSMContext):
+async def main_menu_callback(callback: CallbackQuery, state: FSMContext, lang: str):
     await state.clear()
-    user = await db.get_user(callback.from_user.id)
-    lang = user.get('language_code', 'uz') if user else 'uz'
-    
     is_premium = await UserService.check_premium_status(callback.from_user.id)
     
     await callback.message.edit_text(
@@ -1,9 +1,58 @@
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Update
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional, Tuple
 from app.core.database import db
+from app.core.metrics import metrics
+import random
+
+# Each action name is a permanent analytics_actions row, so only routes the bot serves get their own name
+KNOWN_COMMANDS = frozenset({"/start", "/admin", "/reconcile_stats", "/export_analytics", "/export"})
+KNOWN_CALLBACKS = frozenset({
+    "main_menu", "check_subscription", "create_contest", "select_channel", "cancel_creation",
+    "join_contest", "my_contests", "contest_stats", "contest_detailed_stats", "contest_participants",
+    "contest_winners", "contest_ended", "edit_contest", "export_participants", "analytics",
+    "my_channels", "referral", "notifications", "mark_read", "settings", "support",
+    "premium", "premium_info", "premium_features", "buy_premium",
+    "admin_broadcast", "admin_stats", "admin_analytics", "admin_users", "admin_contests",
+})
+UNKNOWN_ROUTE = "unknown"
+
+def describe_update(update: Update) -> Optional[Tuple[int, str, Optional[str], Optional[int]]]:
+    """Reduce an update to (user_id, action, arg, chat_id) without serializing the whole payload."""
+    if update.message and update.message.from_user:
+        message = update.message
+        arg = None
+        if message.text and message.text.startswith("/"):
+            command, _, arg = message.text.partition(" ")
+            command = command.split('@', 1)[0]
+            if command not in KNOWN_COMMANDS:
+                command, arg = UNKNOWN_ROUTE, None
+            action = f"command:{command}"
+        else:
+            action = f"message:{message.content_type}"
+        chat_id = message.chat.id if message.chat.type != "private" else None
+        return message.from_user.id, action, arg[:64] if arg else None, chat_id
+    
+    if update.callback_query:
+        callback = update.callback_query
+        route, _, arg = (callback.data or "").partition(":")
+        if route not in KNOWN_CALLBACKS:
+            route, arg = UNKNOWN_ROUTE, None
+        return callback.from_user.id, f"callback:{route}", arg[:64] if arg else None, None
+    
+    return None
 
 class AnalyticsMiddleware(BaseMiddleware):
+    def __init__(self, sample_rates: Dict[str, float] = None, default_rate: float = 1.0):
+        self.sample_rates = sample_rates or {}
+        self.default_rate = default_rate
+    
+    def _sample_rate(self, action: str) -> float:
+        # Exact action first, then its kind ("callback", "message", "command")
+        if action in self.sample_rates:
+            return self.sample_rates[action]
+        return self.sample_rates.get(action.split(":", 1)[0], self.default_rate)
+    
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -11,21 +60,23 @@ class AnalyticsMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         if isinstance(event, Update):
-            user_id = None
-            action = "unknown"
-            
-            if event.message:
-                user_id = event.message.from_user.id
-                action = f"message:{event.message.text[:20] if event.message.text else 'media'}"
-            elif event.callback_query:
-                user_id = event.callback_query.from_user.id
-                action = f"callback:{event.callback_query.data}"
-            
-            if user_id:
-                await db.log_analytics(
-                    user_id=user_id,
-                    action=action,
-                    data=str(event.model_dump())[:500]
-                )
+            described = describe_update(event)
+            if described:
+                user_id, action, arg, chat_id = described
+                # Active-user counts come from the sketch, so they stay exact under sampling
+                db.track_activity(user_id)
+                rate = self._sample_rate(action)
+                if rate >= 1 or random.random() < rate:
+                    queued = db.log_analytics_nowait(
+                        user_id=user_id,
+                        action=action,
+                        arg=arg,
+                        chat_id=chat_id,
+                        # Lets reports scale sampled counts back up
+                        weight=round(1 / rate, 3) if rate < 1 else None
+                    )
+                    metrics.record_analytics_event("queued" if queued else "dropped")
+                else:
+                    metrics.record_analytics_event("sampled_out")
         
         return await handler(event, data)
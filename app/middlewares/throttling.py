@@ -1,13 +1,29 @@
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from typing import Callable, Dict, Any, Awaitable
-from app.core.redis import cache
-import time
+from typing import Callable, Dict, Any, Awaitable, Collection, List
+from app.core.metrics import metrics
+from app.core.rate_limiter import RateLimit, limiter
 
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, rate_limit: int = 30, window: int = 60):
-        self.rate_limit = rate_limit
-        self.window = window
+    def __init__(self, rate_limit: int = 30, window: int = 60,
+                 chat_limit: int = 0, chat_window: int = 60,
+                 global_limit: int = 0, global_window: int = 1,
+                 route_costs: Dict[str, int] = None,
+                 route_limits: Dict[str, List[int]] = None,
+                 exempt_ids: Collection[int] = (),
+                 shed_in_flight: int = 0, shed_min_cost: int = 2):
+        self.user_limit = RateLimit("user", rate_limit, window)
+        self.chat_limit = RateLimit("chat", chat_limit, chat_window) if chat_limit else None
+        self.global_limit = RateLimit("global", global_limit, global_window) if global_limit else None
+        self.route_costs = route_costs or {}
+        self.route_limits = {
+            route: RateLimit(f"route:{route}", limit, route_window)
+            for route, (limit, route_window) in (route_limits or {}).items()
+        }
+        self.exempt_ids = frozenset(exempt_ids)
+        self.shed_in_flight = shed_in_flight
+        self.shed_min_cost = shed_min_cost
+        self.in_flight = 0
     
     async def __call__(
         self,
@@ -16,27 +32,52 @@ class ThrottlingMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         user_id = None
+        chat = None
         
         if isinstance(event, Message):
             user_id = event.from_user.id
+            chat = event.chat
         elif isinstance(event, CallbackQuery):
             user_id = event.from_user.id
+            chat = event.message.chat if event.message else None
         
-        if user_id:
-            key = f"throttle:{user_id}"
-            current_time = int(time.time())
+        # Registered as an inner middleware, so the matched handler is already known
+        handler_object = data.get("handler")
+        route = handler_object.callback.__name__ if handler_object else "unknown"
+        cost = self.route_costs.get(route, 1)
+        
+        if user_id and user_id not in self.exempt_ids:
+            if self.shed_in_flight and self.in_flight >= self.shed_in_flight and cost >= self.shed_min_cost:
+                metrics.record_throttled(route, "overload")
+                await self._reject(event, "⏳ Server hozir band. Birozdan so'ng qayta urinib ko'ring.")
+                return
             
-            requests = await cache.get(key) or []
-            requests = [req for req in requests if current_time - req < self.window]
+            checks = [(self.user_limit, user_id)]
+            # In a private chat the chat is the user, so the user limit already covers it
+            if self.chat_limit and chat and chat.type != "private":
+                checks.append((self.chat_limit, chat.id))
+            if self.global_limit:
+                checks.append((self.global_limit, "all"))
+            if route in self.route_limits:
+                checks.append((self.route_limits[route], user_id))
             
-            if len(requests) >= self.rate_limit:
-                if isinstance(event, Message):
-                    await event.answer("⚠️ Juda ko'p so'rov! Biroz kuting.")
-                elif isinstance(event, CallbackQuery):
-                    await event.answer("⚠️ Juda ko'p so'rov! Biroz kuting.", show_alert=True)
+            rejected = await limiter.hit(checks, cost=cost)
+            if rejected:
+                metrics.record_throttled(route, rejected.name)
+                await self._reject(event, "⚠️ Juda ko'p so'rov! Biroz kuting.")
                 return
-            
-            requests.append(current_time)
-            await cache.set(key, requests, expire=self.window)
         
-        return await handler(event, data)
+        self.in_flight += 1
+        metrics.set_in_flight(self.in_flight)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            metrics.set_in_flight(self.in_flight)
+    
+    @staticmethod
+    async def _reject(event: TelegramObject, text: str):
+        if isinstance(event, Message):
+            await event.answer(text)
+        elif isinstance(event, CallbackQuery):
+            await event.answer(text, show_alert=True)
@@ -0,0 +1,19 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from app.services.user_service import UserService
+
+class UserLoaderMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user: User = data.get("event_from_user")
+        user = await UserService.get_user_with_cache(from_user.id) if from_user else None
+        
+        data["user"] = user
+        data["lang"] = user.get('language_code', 'uz') if user else 'uz'
+        
+        return await handler(event, data)
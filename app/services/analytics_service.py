@@ -1,10 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, func, desc, insert, delete
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 
-from app.core.database import User, Contest, Participant, UserAnalytics, ContestAnalytics
+from app.core.config import settings
+from app.core.database import (
+    db, User, Contest, Participant, UserAnalytics, ContestAnalytics, ContestAnalyticsRollup, OwnerStats
+)
 from app.core.redis import cache
+from app.core.timeseries import Aggregate, bucket_start, MINUTE, HOUR
 import json
 
 class AnalyticsService:
@@ -21,7 +25,7 @@ class AnalyticsService:
         self.db.add(analytics)
         await self.db.commit()
         
-        await cache.delete(f"user_analytics:{user_id}")
+        await cache.invalidate_tag("owner", user_id)
     
     async def track_contest_metric(self, contest_id: int, metric_name: str, metric_value: float):
         analytics = ContestAnalytics(
@@ -33,99 +37,125 @@ class AnalyticsService:
         self.db.add(analytics)
         await self.db.commit()
         
-        await cache.delete(f"contest_analytics:{contest_id}")
+        await cache.invalidate_tag("contest", contest_id)
+    
+    async def _query_user_analytics(self, user_id: int) -> Dict[str, Any]:
+        # owner_stats is only kept current by the SQLite triggers; other backends aggregate contests directly
+        if self.db.bind.dialect.name == "sqlite":
+            return await self._query_owner_summary(user_id)
+        return await self._query_owner_aggregate(user_id)
+    
+    @staticmethod
+    def _month_starts():
+        this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return this_month, (this_month - timedelta(days=1)).replace(day=1)
+    
+    async def _query_owner_summary(self, user_id: int) -> Dict[str, Any]:
+        # One statement: totals from owner_stats, month counts and participant extremes from indexed ranges of contests
+        this_month, last_month = self._month_starts()
+        
+        recent = (
+            select(
+                func.count().filter(Contest.created_at >= this_month).label("this_month"),
+                func.count().filter(Contest.created_at < this_month).label("last_month")
+            )
+            .where(Contest.owner_id == user_id, Contest.created_at >= last_month)
+            .subquery()
+        )
+        max_participants = (
+            select(func.max(Contest.participant_count))
+            .where(Contest.owner_id == user_id)
+            .scalar_subquery()
+        )
+        min_participants = (
+            select(func.min(Contest.participant_count))
+            .where(Contest.owner_id == user_id, Contest.participant_count > 0)
+            .scalar_subquery()
+        )
+        
+        result = await self.db.execute(
+            select(OwnerStats, recent.c.this_month, recent.c.last_month, max_participants, min_participants)
+            .select_from(recent)
+            .outerjoin(OwnerStats, OwnerStats.owner_id == user_id)
+        )
+        stats, this_month_contests, last_month_contests, max_count, min_count = result.one()
+        stats = stats or OwnerStats()
+        
+        return {
+            "total_contests": stats.total_contests or 0,
+            "active_contests": stats.active_contests or 0,
+            "completed_contests": stats.completed_contests or 0,
+            "cancelled_contests": stats.cancelled_contests or 0,
+            "total_participants": stats.total_participants or 0,
+            "avg_participants": (
+                stats.participant_count_sum / stats.contests_with_participants
+                if stats.contests_with_participants else 0.0
+            ),
+            "max_participants": max_count or 0,
+            "min_participants": min_count or 0,
+            "total_views": stats.total_views or 0,
+            "this_month_contests": this_month_contests or 0,
+            "last_month_contests": last_month_contests or 0,
+        }
+    
+    async def _query_owner_aggregate(self, user_id: int) -> Dict[str, Any]:
+        # One pass over the owner's contests plus a participant count, for backends without owner_stats triggers
+        this_month, last_month = self._month_starts()
+        has_participants = Contest.participant_count > 0
+        total_participants = (
+            select(func.count(Participant.id))
+            .join(Contest, Contest.id == Participant.contest_id)
+            .where(Contest.owner_id == user_id)
+            .scalar_subquery()
+        )
+        
+        result = await self.db.execute(
+            select(
+                func.count(Contest.id),
+                func.count().filter(Contest.status == "active"),
+                func.count().filter(Contest.status == "ended"),
+                func.count().filter(Contest.status == "cancelled"),
+                total_participants,
+                func.sum(Contest.participant_count),
+                func.count().filter(has_participants),
+                func.max(Contest.participant_count),
+                func.min(Contest.participant_count).filter(has_participants),
+                func.sum(Contest.view_count),
+                func.count().filter(Contest.created_at >= this_month),
+                func.count().filter(Contest.created_at >= last_month, Contest.created_at < this_month)
+            ).where(Contest.owner_id == user_id)
+        )
+        (total_contests, active_contests, completed_contests, cancelled_contests, participants,
+         participant_count_sum, contests_with_participants, max_count, min_count, total_views,
+         this_month_contests, last_month_contests) = result.one()
+        
+        return {
+            "total_contests": total_contests or 0,
+            "active_contests": active_contests or 0,
+            "completed_contests": completed_contests or 0,
+            "cancelled_contests": cancelled_contests or 0,
+            "total_participants": participants or 0,
+            "avg_participants": (
+                participant_count_sum / contests_with_participants
+                if contests_with_participants else 0.0
+            ),
+            "max_participants": max_count or 0,
+            "min_participants": min_count or 0,
+            "total_views": total_views or 0,
+            "this_month_contests": this_month_contests or 0,
+            "last_month_contests": last_month_contests or 0,
+        }
     
     async def get_user_analytics(self, user_id: int) -> Dict[str, Any]:
         cache_key = f"user_analytics:{user_id}"
-        cached_analytics = await cache.get(cache_key)
+        tags = [f"owner:{user_id}"]
+        cached_analytics = await cache.get(cache_key, tags=tags)
         
         if cached_analytics:
             return cached_analytics
         
         try:
-            total_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(Contest.owner_id == user_id)
-            )
-            
-            active_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(
-                    and_(Contest.owner_id == user_id, Contest.status == "active")
-                )
-            )
-            
-            completed_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(
-                    and_(Contest.owner_id == user_id, Contest.status == "ended")
-                )
-            )
-            
-            cancelled_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(
-                    and_(Contest.owner_id == user_id, Contest.status == "cancelled")
-                )
-            )
-            
-            total_participants = await self.db.execute(
-                select(func.count(Participant.id))
-                .join(Contest)
-                .where(Contest.owner_id == user_id)
-            )
-            
-            total_views = await self.db.execute(
-                select(func.sum(Contest.view_count)).where(Contest.owner_id == user_id)
-            )
-            
-            this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            last_month = (this_month - timedelta(days=1)).replace(day=1)
-            
-            this_month_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(
-                    and_(
-                        Contest.owner_id == user_id,
-                        Contest.created_at >= this_month
-                    )
-                )
-            )
-            
-            last_month_contests = await self.db.execute(
-                select(func.count(Contest.id)).where(
-                    and_(
-                        Contest.owner_id == user_id,
-                        Contest.created_at >= last_month,
-                        Contest.created_at < this_month
-                    )
-                )
-            )
-            
-            avg_participants_result = await self.db.execute(
-                select(func.avg(Contest.participant_count)).where(
-                    and_(Contest.owner_id == user_id, Contest.participant_count > 0)
-                )
-            )
-            
-            max_participants_result = await self.db.execute(
-                select(func.max(Contest.participant_count)).where(Contest.owner_id == user_id)
-            )
-            
-            min_participants_result = await self.db.execute(
-                select(func.min(Contest.participant_count)).where(
-                    and_(Contest.owner_id == user_id, Contest.participant_count > 0)
-                )
-            )
-            
-            analytics = {
-                "total_contests": total_contests.scalar() or 0,
-                "active_contests": active_contests.scalar() or 0,
-                "completed_contests": completed_contests.scalar() or 0,
-                "cancelled_contests": cancelled_contests.scalar() or 0,
-                "total_participants": total_participants.scalar() or 0,
-                "avg_participants": float(avg_participants_result.scalar() or 0),
-                "max_participants": max_participants_result.scalar() or 0,
-                "min_participants": min_participants_result.scalar() or 0,
-                "total_views": total_views.scalar() or 0,
-                "this_month_contests": this_month_contests.scalar() or 0,
-                "last_month_contests": last_month_contests.scalar() or 0,
-            }
+            analytics = await self._query_user_analytics(user_id)
             
             if analytics["last_month_contests"] > 0:
                 analytics["growth_rate"] = ((analytics["this_month_contests"] - analytics["last_month_contests"]) / analytics["last_month_contests"]) * 100
@@ -142,7 +172,7 @@ class AnalyticsService:
             else:
                 analytics["participation_rate"] = 0
             
-            await cache.set(cache_key, analytics, 1800)
+            await cache.set(cache_key, analytics, 1800, tags=tags)
             return analytics
         
         except Exception as e:
@@ -163,215 +193,208 @@ class AnalyticsService:
                 "participation_rate": 0
             }
     
-    async def get_contest_analytics(self, contest_id: int) -> Dict[str, Any]:
-        cache_key = f"contest_analytics:{contest_id}"
-        cached_analytics = await cache.get(cache_key)
+    async def get_contest_metrics(self, contest_id: int, days: int = 7) -> Dict[str, List[Dict[str, Any]]]:
+        cache_key = f"contest_metrics:{contest_id}:{days}"
+        tags = [f"contest:{contest_id}"]
+        cached_metrics = await cache.get(cache_key, tags=tags)
         
-        if cached_analytics:
-            return cached_analytics
+        if cached_metrics:
+            return cached_metrics
         
         try:
-            result = await self.db.execute(
-                select(ContestAnalytics)
-                .where(ContestAnalytics.contest_id == contest_id)
-                .order_by(desc(ContestAnalytics.timestamp))
-            )
-            
-            metrics = result.scalars().all()
-            analytics = {}
-            
-            for metric in metrics:
-                if metric.metric_name not in analytics:
-                    analytics[metric.metric_name] = []
-                analytics[metric.metric_name].append({
-                    "value": metric.metric_value,
-                    "timestamp": metric.timestamp
-                })
-            
-            await cache.set(cache_key, analytics, 900)
-            return analytics
+            metrics = await self._query_contest_metrics(contest_id, datetime.utcnow() - timedelta(days=days))
+            await cache.set(cache_key, metrics, 900, tags=tags)
+            return metrics
         
         except Exception:
             return {}
     
     @staticmethod
-    async def get_system_analytics(days: int = 7) -> Dict[str, Any]:
-        cache_key = f"system_analytics:{days}"
-        analytics = await cache.get(cache_key)
+    def _metrics_resolution(since: datetime, now: datetime) -> int:
+        # The oldest point requested decides: finer data no longer exists that far back
+        if since >= now - timedelta(days=settings.CONTEST_METRICS_RAW_DAYS):
+            return 0
+        if since >= now - timedelta(days=settings.CONTEST_METRICS_MINUTE_DAYS):
+            return MINUTE
+        return HOUR
+    
+    async def _query_contest_metrics(self, contest_id: int, since: datetime) -> Dict[str, List[Dict[str, Any]]]:
+        resolution = self._metrics_resolution(since, datetime.utcnow())
+        raw = await self.db.execute(
+            select(ContestAnalytics.metric_name, ContestAnalytics.metric_value, ContestAnalytics.timestamp)
+            .where(ContestAnalytics.contest_id == contest_id, ContestAnalytics.timestamp >= since)
+            .order_by(desc(ContestAnalytics.timestamp))
+        )
         
-        if not analytics:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            # User growth
-            cursor = await db.connection.execute("""
-                SELECT DATE(created_at) as date, COUNT(*) as count 
-                FROM users 
-                WHERE created_at >= ? AND created_at <= ?
-                GROUP BY DATE(created_at) 
-                ORDER BY date
-            """, (start_date.isoformat(), end_date.isoformat()))
-            user_growth = await cursor.fetchall()
-            
-            # Contest creation stats
-            cursor = await db.connection.execute("""
-                SELECT DATE(created_at) as date, COUNT(*) as count 
-                FROM contests 
-                WHERE created_at >= ? AND created_at <= ?
-                GROUP BY DATE(created_at) 
-                ORDER BY date
-            """, (start_date.isoformat(), end_date.isoformat()))
-            contest_creation = await cursor.fetchall()
-            
-            # Participation stats
-            cursor = await db.connection.execute("""
-                SELECT DATE(joined_at) as date, COUNT(*) as count 
-                FROM participants 
-                WHERE joined_at >= ? AND joined_at <= ?
-                GROUP BY DATE(joined_at) 
-                ORDER BY date
-            """, (start_date.isoformat(), end_date.isoformat()))
-            participation_stats = await cursor.fetchall()
-            
-            # Top channels by contests
-            cursor = await db.connection.execute("""
-                SELECT c.title, COUNT(co.id) as contest_count, SUM(co.participant_count) as total_participants
-                FROM channels c
-                LEFT JOIN contests co ON c.channel_id = co.channel_id
-                WHERE co.created_at >= ? AND co.created_at <= ?
-                GROUP BY c.id
-                ORDER BY contest_count DESC
-                LIMIT 10
-            """, (start_date.isoformat(), end_date.isoformat()))
-            top_channels = await cursor.fetchall()
-            
-            # Most active users
-            cursor = await db.connection.execute("""
-                SELECT u.first_name, u.username, COUNT(c.id) as contest_count
-                FROM users u
-                LEFT JOIN contests c ON u.id = c.owner_id
-                WHERE c.created_at >= ? AND c.created_at <= ?
-                GROUP BY u.id
-                ORDER BY contest_count DESC
-                LIMIT 10
-            """, (start_date.isoformat(), end_date.isoformat()))
-            active_users = await cursor.fetchall()
-            
-            analytics = {
-                "user_growth": [{"date": row[0], "count": row[1]} for row in user_growth],
-                "contest_creation": [{"date": row[0], "count": row[1]} for row in contest_creation],
-                "participation_stats": [{"date": row[0], "count": row[1]} for row in participation_stats],
-                "top_channels": [{"title": row[0], "contests": row[1], "participants": row[2]} for row in top_channels],
-                "active_users": [{"name": row[0], "username": row[1], "contests": row[2]} for row in active_users]
+        metrics: Dict[str, List[Dict[str, Any]]] = {}
+        if not resolution:
+            for name, value, timestamp in raw:
+                metrics.setdefault(name, []).append({"value": value, "timestamp": timestamp})
+            return metrics
+        
+        # Recent raw points and finer rollups are folded into the chosen resolution so the series is uniform
+        buckets: Dict[tuple, Aggregate] = {}
+        for name, value, timestamp in raw:
+            key = (name, bucket_start(timestamp, resolution))
+            buckets.setdefault(key, Aggregate()).add(value, timestamp)
+        
+        rollups = await self.db.execute(
+            select(ContestAnalyticsRollup).where(
+                ContestAnalyticsRollup.contest_id == contest_id,
+                ContestAnalyticsRollup.resolution <= resolution,
+                ContestAnalyticsRollup.bucket_start >= bucket_start(since, resolution)
+            )
+        )
+        for rollup in rollups.scalars():
+            key = (rollup.metric_name, bucket_start(rollup.bucket_start, resolution))
+            self._merge_rollup(buckets.setdefault(key, Aggregate()), rollup)
+        
+        for (name, start), aggregate in sorted(buckets.items(), key=lambda item: item[0][1], reverse=True):
+            metrics.setdefault(name, []).append(aggregate.to_dict(start))
+        return metrics
+    
+    @staticmethod
+    def _merge_rollup(aggregate: Aggregate, rollup: ContestAnalyticsRollup):
+        aggregate.merge(rollup.min_value, rollup.max_value, rollup.avg_value, rollup.sample_count,
+                        rollup.last_value, rollup.last_at)
+    
+    async def _store_rollups(self, buckets: Dict[tuple, Aggregate], resolution: int):
+        if not buckets:
+            return
+        await self.db.execute(insert(ContestAnalyticsRollup), [
+            {
+                "contest_id": contest_id, "metric_name": name, "resolution": resolution, "bucket_start": start,
+                "min_value": aggregate.min, "max_value": aggregate.max, "avg_value": aggregate.avg,
+                "last_value": aggregate.last, "last_at": aggregate.last_at, "sample_count": aggregate.count
             }
-            
-            await cache.set(cache_key, analytics, expire=3600)
+            for (contest_id, name, start), aggregate in buckets.items()
+        ])
+    
+    async def compact_contest_metrics(self, now: datetime = None) -> Dict[str, int]:
+        """Roll raw points past retention into minutes and old minutes into hours, in one transaction."""
+        now = now or datetime.utcnow()
+        raw_cutoff = bucket_start(now - timedelta(days=settings.CONTEST_METRICS_RAW_DAYS), MINUTE)
+        minute_cutoff = bucket_start(now - timedelta(days=settings.CONTEST_METRICS_MINUTE_DAYS), HOUR)
         
-        return analytics
+        buckets: Dict[tuple, Aggregate] = {}
+        raw = await self.db.stream(
+            select(
+                ContestAnalytics.contest_id, ContestAnalytics.metric_name,
+                ContestAnalytics.metric_value, ContestAnalytics.timestamp
+            ).where(ContestAnalytics.timestamp < raw_cutoff)
+        )
+        async for contest_id, name, value, timestamp in raw:
+            key = (contest_id, name, bucket_start(timestamp, MINUTE))
+            buckets.setdefault(key, Aggregate()).add(value, timestamp)
+        raw_points = sum(aggregate.count for aggregate in buckets.values())
+        
+        await self._store_rollups(buckets, MINUTE)
+        await self.db.execute(delete(ContestAnalytics).where(ContestAnalytics.timestamp < raw_cutoff))
+        
+        # Runs after the first stage, so raw points older than both cutoffs end up hourly in a single pass
+        buckets = {}
+        minutes = await self.db.stream(
+            select(ContestAnalyticsRollup).where(
+                ContestAnalyticsRollup.resolution == MINUTE,
+                ContestAnalyticsRollup.bucket_start < minute_cutoff
+            )
+        )
+        minute_rollups = 0
+        async for rollup in minutes.scalars():
+            key = (rollup.contest_id, rollup.metric_name, bucket_start(rollup.bucket_start, HOUR))
+            self._merge_rollup(buckets.setdefault(key, Aggregate()), rollup)
+            minute_rollups += 1
+        
+        await self._store_rollups(buckets, HOUR)
+        await self.db.execute(
+            delete(ContestAnalyticsRollup).where(
+                ContestAnalyticsRollup.resolution == MINUTE,
+                ContestAnalyticsRollup.bucket_start < minute_cutoff
+            )
+        )
+        
+        await self.db.commit()
+        return {"raw_points": raw_points, "minute_rollups": minute_rollups}
+    
+    @staticmethod
+    async def get_system_analytics(days: int = 7) -> Dict[str, Any]:
+        return await cache.get_or_compute(
+            f"system_analytics:{days}", lambda: AnalyticsService._compute_system_analytics(days),
+            ttl=3600, stale_ttl=600
+        )
+    
+    @staticmethod
+    async def _compute_system_analytics(days: int) -> Dict[str, Any]:
+        # Reads the rollup tables, so the cost depends on the range rather than on total history
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        
+        user_growth = await db.get_rollup("users", start_date, end_date)
+        contest_creation = await db.get_rollup("contests", start_date, end_date)
+        participation_stats = await db.get_rollup("participants", start_date, end_date)
+        top_channels = await db.get_top_channels(start_date, end_date)
+        active_users = await db.get_top_contest_owners(start_date, end_date)
+        
+        return {
+            "user_growth": user_growth,
+            "contest_creation": contest_creation,
+            "participation_stats": participation_stats,
+            "top_channels": [
+                {"title": row["title"], "contests": row["contests"], "participants": row["participants"]}
+                for row in top_channels
+            ],
+            "active_users": [
+                {"name": row["first_name"], "username": row["username"], "contests": row["contests"]}
+                for row in active_users
+            ]
+        }
     
     @staticmethod
     async def get_contest_analytics(contest_id: int) -> Dict[str, Any]:
         cache_key = f"contest_analytics:{contest_id}"
-        analytics = await cache.get(cache_key)
+        tags = [f"contest:{contest_id}"]
+        analytics = await cache.get(cache_key, tags=tags)
         
         if not analytics:
             contest = await db.get_contest(contest_id)
             if not contest:
                 return {}
             
-            # Participation timeline
-            cursor = await db.connection.execute("""
-                SELECT DATE(joined_at) as date, COUNT(*) as count 
-                FROM participants 
-                WHERE contest_id = ?
-                GROUP BY DATE(joined_at) 
-                ORDER BY date
-            """, (contest_id,))
-            participation_timeline = await cursor.fetchall()
-            
-            # Hourly participation
-            cursor = await db.connection.execute("""
-                SELECT strftime('%H', joined_at) as hour, COUNT(*) as count 
-                FROM participants 
-                WHERE contest_id = ?
-                GROUP BY strftime('%H', joined_at) 
-                ORDER BY hour
-            """, (contest_id,))
-            hourly_participation = await cursor.fetchall()
-            
-            # Referral sources
-            cursor = await db.connection.execute("""
-                SELECT referral_source, COUNT(*) as count 
-                FROM participants 
-                WHERE contest_id = ? AND referral_source IS NOT NULL
-                GROUP BY referral_source 
-                ORDER BY count DESC
-            """, (contest_id,))
-            referral_sources = await cursor.fetchall()
+            # Counters maintained on join, so this is O(buckets) however large the contest is
+            histograms = await db.get_contest_histograms(contest_id)
             
             analytics = {
                 "contest": contest,
-                "participation_timeline": [{"date": row[0], "count": row[1]} for row in participation_timeline],
-                "hourly_participation": [{"hour": row[0], "count": row[1]} for row in hourly_participation],
-                "referral_sources": [{"source": row[0], "count": row[1]} for row in referral_sources]
+                "participation_timeline": histograms["timeline"],
+                "hourly_participation": histograms["hourly"],
+                "referral_sources": histograms["referrals"]
             }
             
-            await cache.set(cache_key, analytics, expire=1800)
+            await cache.set(cache_key, analytics, expire=1800, tags=tags)
         
         return analytics
     
     @staticmethod
     async def get_user_engagement_metrics() -> Dict[str, Any]:
-        cache_key = "user_engagement_metrics"
-        metrics = await cache.get(cache_key)
-        
-        if not metrics:
-            # Daily active users
-            cursor = await db.connection.execute("""
-                SELECT COUNT(DISTINCT user_id) 
-                FROM analytics 
-                WHERE created_at >= datetime('now', '-1 day')
-            """)
-            daily_active = (await cursor.fetchone())[0]
-            
-            # Weekly active users
-            cursor = await db.connection.execute("""
-                SELECT COUNT(DISTINCT user_id) 
-                FROM analytics 
-                WHERE created_at >= datetime('now', '-7 days')
-            """)
-            weekly_active = (await cursor.fetchone())[0]
-            
-            # Monthly active users
-            cursor = await db.connection.execute("""
-                SELECT COUNT(DISTINCT user_id) 
-                FROM analytics 
-                WHERE created_at >= datetime('now', '-30 days')
-            """)
-            monthly_active = (await cursor.fetchone())[0]
-            
-            # Average session duration (approximated)
-            cursor = await db.connection.execute("""
-                SELECT AVG(session_count) as avg_actions_per_session
-                FROM (
-                    SELECT user_id, COUNT(*) as session_count
-                    FROM analytics 
-                    WHERE created_at >= datetime('now', '-7 days')
-                    GROUP BY user_id, DATE(created_at)
-                ) sessions
-            """)
-            avg_session_actions = (await cursor.fetchone())[0] or 0
-            
-            metrics = {
-                "daily_active_users": daily_active,
-                "weekly_active_users": weekly_active,
-                "monthly_active_users": monthly_active,
-                "avg_session_actions": round(avg_session_actions, 2)
-            }
-            
-            await cache.set(cache_key, metrics, expire=1800)
+        return await cache.get_or_compute(
+            "user_engagement_metrics", AnalyticsService._compute_user_engagement_metrics,
+            ttl=1800, stale_ttl=300
+        )
+    
+    @staticmethod
+    async def _compute_user_engagement_metrics() -> Dict[str, Any]:
+        # Merges at most 30 daily sketches, independent of event volume
+        stats = await db.get_activity_stats((1, 7, 30))
+        weekly = stats[7]
+        # A session is approximated as one user's activity within a day
+        avg_session_actions = weekly["events"] / weekly["user_days"] if weekly["user_days"] else 0
         
-        return metrics
+        return {
+            "daily_active_users": stats[1]["users"],
+            "weekly_active_users": weekly["users"],
+            "monthly_active_users": stats[30]["users"],
+            "avg_session_actions": round(avg_session_actions, 2)
+        }
     
     async def get_popular_contests(self, limit: int = 10) -> List[Contest]:
         try:
@@ -1,4 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import asyncio
 import logging
@@ -111,15 +112,15 @@ class BroadcastService:
     @staticmethod
     async def send_broadcast(bot: Bot, message_data: Dict[str, Any], 
                            target_users: List[int] = None) -> Dict[str, int]:
-        if target_users is None:
-            users = await db.get_all_active_users()
-            target_users = [user['id'] for user in users]
-        
         success_count = 0
         failed_count = 0
         blocked_count = 0
+        total_count = 0
+        # Deactivated in one write after the loop so no transaction stays open across sends
+        blocked_users = []
         
-        for user_id in target_users:
+        async for user_id in BroadcastService._iter_targets(target_users):
+            total_count += 1
             try:
                 if message_data.get('photo'):
                     await bot.send_photo(
@@ -149,23 +150,30 @@ class BroadcastService:
                 error_str = str(e).lower()
                 if 'blocked' in error_str or 'deactivated' in error_str:
                     blocked_count += 1
-                    await db.connection.execute("""
-                        UPDATE users SET is_active = 0 WHERE id = ?
-                    """, (user_id,))
+                    blocked_users.append(user_id)
                 else:
                     failed_count += 1
                 
                 logger.warning(f"Failed to send message to {user_id}: {e}")
         
-        await db.connection.commit()
+        await db.deactivate_users(blocked_users)
         
         return {
             "success": success_count,
             "failed": failed_count,
             "blocked": blocked_count,
-            "total": len(target_users)
+            "total": total_count
         }
     
+    @staticmethod
+    async def _iter_targets(target_users: Optional[List[int]]):
+        if target_users is None:
+            async for user_id in db.iter_active_user_ids():
+                yield user_id
+        else:
+            for user_id in target_users:
+                yield user_id
+    
     @staticmethod
     async def send_targeted_broadcast(bot: Bot, message_data: Dict[str, Any], 
                                     filters: Dict[str, Any]) -> Dict[str, int]:
@@ -184,8 +192,9 @@ class BroadcastService:
             query += " AND created_at >= ?"
             params.append(filters['created_after'])
         
-        cursor = await db.connection.execute(query, params)
-        rows = await cursor.fetchall()
+        async with db.reader() as conn:
+            cursor = await conn.execute(query, params)
+            rows = await cursor.fetchall()
         target_users = [row[0] for row in rows]
         
         return await BroadcastService.send_broadcast(bot, message_data, target_users)
@@ -197,19 +206,18 @@ class BroadcastService:
             return
         
         if notification_type == "started":
-            participants = await db.get_contest_participants(contest_id)
             message_text = f"🎉 Konkurs boshlandi!\n\n🏆 {contest['title']}\n\n📝 {contest['description']}"
             
-            for participant in participants:
+            async for participant_id in db.iter_contest_participant_ids(contest_id):
                 try:
                     await bot.send_message(
-                        chat_id=participant['id'],
+                        chat_id=participant_id,
                         text=message_text,
                         parse_mode='HTML'
                     )
                     await asyncio.sleep(0.05)
                 except Exception as e:
-                    logger.warning(f"Failed to notify participant {participant['id']}: {e}")
+                    logger.warning(f"Failed to notify participant {participant_id}: {e}")
         
         elif notification_type == "ended":
             winners = await db.get_contest_winners(contest_id)
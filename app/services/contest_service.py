@@ -1,7 +1,7 @@
 import random
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-from app.core.database import db
+from app.core.database import db, JoinResult, JoinStatus
 from app.core.redis import cache
 import logging
 
@@ -38,46 +38,33 @@ class ContestService:
             requirements=requirements
         )
         
-        await cache.delete(f"user_contests:{owner_id}")
-        await cache.delete("active_contests")
+        await cache.invalidate_tags([f"owner:{owner_id}", "contests"])
         
         return contest_id
     
     @staticmethod
     async def get_contest_with_cache(contest_id: int) -> Optional[Dict[str, Any]]:
         cache_key = f"contest:{contest_id}"
-        contest = await cache.get(cache_key)
+        tags = [f"contest:{contest_id}"]
+        contest = await cache.get(cache_key, tags=tags)
         
         if not contest:
             contest = await db.get_contest(contest_id)
             if contest:
-                await cache.set(cache_key, contest, expire=300)
+                await cache.set(cache_key, contest, expire=300, tags=tags)
         
         return contest
     
     @staticmethod
-    async def join_contest(contest_id: int, user_id: int, referral_source: str = None) -> bool:
-        contest = await ContestService.get_contest_with_cache(contest_id)
+    async def join_contest(contest_id: int, user_id: int, referral_source: str = None) -> JoinResult:
+        result = await db.join_contest(contest_id, user_id, referral_source)
         
-        if not contest or contest['status'] != 'active':
-            return False
-        
-        if contest['max_participants']:
-            current_participants = await db.get_participants_count(contest_id)
-            if current_participants >= contest['max_participants']:
-                return False
-        
-        is_already_participating = await db.is_participating(contest_id, user_id)
-        if is_already_participating:
-            return False
-        
-        success = await db.add_participant(contest_id, user_id, referral_source)
+        if result.status is JoinStatus.JOINED:
+            await cache.invalidate_tags(
+                [f"contest:{contest_id}", f"participant:{user_id}", f"owner:{result.owner_id}"]
+            )
         
-        if success:
-            await cache.delete(f"contest:{contest_id}")
-            await cache.delete(f"contest_participants:{contest_id}")
-        
-        return success
+        return result
     
     @staticmethod
     async def select_winners(contest_id: int) -> List[Dict[str, Any]]:
@@ -85,25 +72,38 @@ class ContestService:
         if not contest:
             return []
         
-        participants = await db.get_contest_participants(contest_id)
-        if not participants:
+        # Reservoir sampling keeps only winners_count rows in memory however large the contest is
+        selected_winners = []
+        seen = 0
+        async for participant in db.iter_contest_participants(contest_id):
+            seen += 1
+            if len(selected_winners) < contest['winners_count']:
+                selected_winners.append(participant)
+            else:
+                slot = random.randrange(seen)
+                if slot < contest['winners_count']:
+                    selected_winners[slot] = participant
+        
+        if not selected_winners:
             return []
         
-        winners_count = min(contest['winners_count'], len(participants))
-        selected_winners = random.sample(participants, winners_count)
+        random.shuffle(selected_winners)
         
         for i, winner in enumerate(selected_winners, 1):
             await db.create_winner(contest_id, winner['id'], i)
         
-        await cache.delete(f"contest:{contest_id}")
-        await cache.delete(f"contest_winners:{contest_id}")
+        await cache.invalidate_tags(
+            [f"contest:{contest_id}", f"owner:{contest['owner_id']}"]
+            + [f"participant:{winner['id']}" for winner in selected_winners]
+        )
         
         return selected_winners
     
     @staticmethod
     async def get_contest_statistics(contest_id: int) -> Dict[str, Any]:
         cache_key = f"contest_stats:{contest_id}"
-        stats = await cache.get(cache_key)
+        tags = [f"contest:{contest_id}"]
+        stats = await cache.get(cache_key, tags=tags)
         
         if not stats:
             contest = await db.get_contest(contest_id)
@@ -122,18 +122,21 @@ class ContestService:
                 "view_count": contest.get('view_count', 0)
             }
             
-            await cache.set(cache_key, stats, expire=60)
+            await cache.set(cache_key, stats, expire=60, tags=tags)
         
         return stats
     
     @staticmethod
     async def end_contest(contest_id: int) -> bool:
         try:
+            contest = await ContestService.get_contest_with_cache(contest_id)
             await db.update_contest_status(contest_id, 'ended')
             winners = await ContestService.select_winners(contest_id)
             
-            await cache.delete(f"contest:{contest_id}")
-            await cache.delete("active_contests")
+            tags = [f"contest:{contest_id}", "contests"]
+            if contest:
+                tags.append(f"owner:{contest['owner_id']}")
+            await cache.invalidate_tags(tags)
             
             return len(winners) > 0
         except Exception as e:
@@ -142,12 +145,10 @@ class ContestService:
     
     @staticmethod
     async def get_trending_contests(limit: int = 10) -> List[Dict[str, Any]]:
-        cache_key = f"trending_contests:{limit}"
-        contests = await cache.get(cache_key)
-        
-        if not contests:
+        async def compute():
             contests = await db.get_active_contests()
-            contests = sorted(contests, key=lambda x: x.get('participant_count', 0), reverse=True)[:limit]
-            await cache.set(cache_key, contests, expire=300)
+            return sorted(contests, key=lambda x: x.get('participant_count', 0), reverse=True)[:limit]
         
-        return contests
+        return await cache.get_or_compute(
+            f"trending_contests:{limit}", compute, ttl=300, stale_ttl=60, tags=["contests"]
+        )
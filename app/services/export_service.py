@@ -0,0 +1,126 @@
+from typing import AsyncIterator, Optional
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import time
+import zlib
+
+from aiogram.types import FSInputFile, Message
+
+from app.core.database import db
+from app.core.config import settings
+
+FORMATS = ("csv", "ndjson")
+
+COLUMNS = {
+    "participants": ("id", "user_id", "username", "first_name", "last_name",
+                     "joined_at", "referral_source", "is_winner"),
+    "winners": ("id", "position", "user_id", "username", "first_name", "last_name",
+                "announced_at", "prize_claimed"),
+    "analytics": ("id", "ts", "user_id", "action", "arg_int", "arg_text", "chat_id", "weight"),
+}
+
+# Uncompressed bytes buffered before each compress call
+CHUNK_SIZE = 64 * 1024
+
+# Placeholder keys from config.py, .env and .env.example; anyone can forge links signed with them
+PLACEHOLDER_SECRET_KEYS = frozenset({"your-super-secret-key-here", "your-secret-key-here"})
+
+class ExportService:
+    @staticmethod
+    def _rows(kind: str, target: int) -> AsyncIterator[tuple]:
+        # target is the contest id, or the number of days for analytics
+        if kind == "participants":
+            return db.iter_participant_export(target)
+        if kind == "winners":
+            return db.iter_winner_export(target)
+        if kind == "analytics":
+            return db.iter_analytics_events(int(time.time()) - target * 86400)
+        raise ValueError(f"Unknown export {kind}")
+    
+    @staticmethod
+    async def stream(kind: str, target: int, fmt: str = "csv") -> AsyncIterator[bytes]:
+        """Gzip-compressed rows; memory stays at one keyset page plus one chunk regardless of size."""
+        columns = COLUMNS[kind]
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        
+        async for row in ExportService._rows(kind, target):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+                buffer.write("\n")
+            
+            if buffer.tell() >= CHUNK_SIZE:
+                data = compressor.compress(buffer.getvalue().encode())
+                buffer.seek(0)
+                buffer.truncate()
+                if data:
+                    yield data
+        
+        yield compressor.compress(buffer.getvalue().encode()) + compressor.flush()
+    
+    @staticmethod
+    async def write_file(kind: str, target: int, fmt: str = "csv") -> str:
+        """Spool an export to a temporary file for upload; the caller removes it."""
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async for chunk in ExportService.stream(kind, target, fmt):
+                    file.write(chunk)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+    
+    @staticmethod
+    async def send(message: Message, kind: str, target: int, fmt: str = "csv"):
+        path = await ExportService.write_file(kind, target, fmt)
+        try:
+            caption = None
+            url = ExportService.download_url(kind, target, fmt)
+            if url:
+                caption = f"🔗 {url}"
+            await message.answer_document(
+                FSInputFile(path, filename=ExportService.filename(kind, target, fmt)), caption=caption
+            )
+        finally:
+            os.remove(path)
+    
+    @staticmethod
+    def filename(kind: str, target: int, fmt: str) -> str:
+        if kind == "analytics":
+            return f"analytics_{target}d.{fmt}.gz"
+        return f"contest_{target}_{kind}.{fmt}.gz"
+    
+    @staticmethod
+    def links_enabled() -> bool:
+        return bool(settings.SECRET_KEY) and settings.SECRET_KEY not in PLACEHOLDER_SECRET_KEYS
+    
+    @staticmethod
+    def sign(kind: str, target: int, expires: int) -> str:
+        message = f"{kind}:{target}:{expires}".encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+    
+    @staticmethod
+    def verify(kind: str, target: int, expires: int, signature: str) -> bool:
+        if not ExportService.links_enabled() or expires < time.time():
+            return False
+        return hmac.compare_digest(ExportService.sign(kind, target, expires), signature)
+    
+    @staticmethod
+    def download_url(kind: str, target: int, fmt: str = "csv") -> Optional[str]:
+        if not settings.WEBHOOK_URL or not ExportService.links_enabled():
+            return None
+        expires = int(time.time()) + settings.EXPORT_LINK_TTL
+        signature = ExportService.sign(kind, target, expires)
+        return f"{settings.WEBHOOK_URL}/export/{kind}/{target}.{fmt}?expires={expires}&signature={signature}"
@@ -33,9 +33,12 @@ class ParticipationService:
         await self.db.commit()
         await self.db.refresh(participant)
         
-        await redis_manager.delete(f"participants_count:{contest_id}")
-        await redis_manager.delete(f"contest:{contest_id}")
-        await redis_manager.delete(f"participation:{contest_id}:{user_id}")
+        await redis_manager.delete_many([
+            f"participants_count:{contest_id}",
+            f"participation:{contest_id}:{user_id}"
+        ])
+        # Contest entries live under generation-tagged keys, which a plain delete never matches
+        await redis_manager.invalidate_tags([f"contest:{contest_id}", f"participant:{user_id}"])
         
         return participant
     
@@ -5,7 +5,9 @@ import logging
 import asyncio
 
 from aiogram import Bot
-from app.core.database import db
+from app.core.config import settings
+from app.core.database import db, get_db
+from app.core.redis import cache
 from app.services.contest_service import ContestService
 from app.services.winner_service import WinnerService
 from app.services.analytics_service import AnalyticsService
@@ -33,7 +35,8 @@ class SchedulerService:
             self.check_contests(),
             self.cleanup_expired_cache(),
             self.update_channel_stats(),
-            self.check_premium_expiry()
+            self.check_premium_expiry(),
+            self.compact_contest_metrics()
         )
     
     async def stop(self):
@@ -43,9 +46,7 @@ class SchedulerService:
     async def check_contests(self):
         while self.running:
             try:
-                contests = await db.get_active_contests()
-                
-                for contest in contests:
+                async for contest in db.iter_active_contests():
                     now = datetime.now()
                     
                     # Start pending contests
@@ -118,6 +119,7 @@ class SchedulerService:
             
             await db.update_contest_status(contest['id'], 'active')
             await db.set_contest_message_id(contest['id'], message.message_id)
+            await cache.invalidate_tags([f"contest:{contest['id']}", f"owner:{contest['owner_id']}", "contests"])
             
             # Send notification to contest owner
             await self.bot.send_message(
@@ -169,6 +171,17 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"Failed to end contest {contest['id']}: {e}")
     
+    async def compact_contest_metrics(self):
+        while self.running:
+            try:
+                async with get_db() as session:
+                    compacted = await AnalyticsService(session).compact_contest_metrics()
+                logger.debug(f"Compacted contest metrics: {compacted}")
+            except Exception as e:
+                logger.error(f"Error compacting contest metrics: {e}")
+            
+            await asyncio.sleep(settings.CONTEST_METRICS_COMPACTION_INTERVAL)
+    
     async def cleanup_expired_cache(self):
         while self.running:
             try:
@@ -184,19 +197,14 @@ class SchedulerService:
     async def update_channel_stats(self):
         while self.running:
             try:
-                channels = await db.connection.execute("SELECT * FROM channels WHERE is_active = 1")
-                channels = await channels.fetchall()
-                
-                for channel in channels:
+                member_counts = {}
+                async for channel in db.iter_active_channels(as_tuple=True):
                     try:
-                        member_count = await self.bot.get_chat_member_count(channel[1])  # channel_id
-                        await db.connection.execute("""
-                            UPDATE channels SET member_count = ? WHERE id = ?
-                        """, (member_count, channel[0]))  # id
+                        member_counts[channel.id] = await self.bot.get_chat_member_count(channel.channel_id)
                     except Exception:
                         continue
                 
-                await db.connection.commit()
+                await db.update_channel_member_counts(member_counts)
                 logger.debug("Updated channel statistics")
                 await asyncio.sleep(3600)  # Run every hour
                 
@@ -207,29 +215,20 @@ class SchedulerService:
     async def check_premium_expiry(self):
         while self.running:
             try:
-                cursor = await db.connection.execute("""
-                    SELECT id FROM users 
-                    WHERE is_premium = 1 AND premium_until < datetime('now')
-                """)
-                expired_users = await cursor.fetchall()
+                # Committed before any notification goes out
+                expired_users = await db.expire_premium_users()
                 
-                for user in expired_users:
-                    await db.connection.execute("""
-                        UPDATE users SET is_premium = 0, premium_until = NULL WHERE id = ?
-                    """, (user[0],))
-                    
+                for user_id in expired_users:
                     # Notify user about premium expiry
                     try:
                         await self.bot.send_message(
-                            chat_id=user[0],
+                            chat_id=user_id,
                             text="⚠️ Sizning Premium obunangiz tugadi!\n\nYangilash uchun /premium buyrug'ini bosing.",
                             parse_mode="HTML"
                         )
                     except Exception:
                         pass
                 
-                await db.connection.commit()
-                
                 if expired_users:
                     logger.info(f"Expired premium for {len(expired_users)} users")
                 
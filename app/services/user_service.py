@@ -9,24 +9,47 @@ class UserService:
     @staticmethod
     async def get_user_with_cache(user_id: int) -> Optional[Dict[str, Any]]:
         cache_key = f"user:{user_id}"
-        user = await cache.get(cache_key)
+        tags = [f"user:{user_id}"]
+        user = await cache.get(cache_key, tags=tags)
         
         if not user:
             user = await db.get_user(user_id)
             if user:
-                await cache.set(cache_key, user, expire=300)
+                await cache.set(cache_key, user, expire=300, tags=tags)
+        
+        return user
+    
+    @staticmethod
+    async def invalidate_user(user_id: int):
+        await cache.invalidate_tag("user", user_id)
+    
+    @staticmethod
+    async def create_or_update_user(user_id: int, username: str = None, first_name: str = None,
+                                    last_name: str = None, language_code: str = "uz") -> Dict[str, Any]:
+        cached = await UserService.get_user_with_cache(user_id)
+        if cached and (cached.get('username'), cached.get('first_name'), cached.get('last_name'),
+                       cached.get('language_code')) == (username, first_name, last_name, language_code):
+            return cached
+        
+        user = await db.create_or_update_user(
+            user_id=user_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            language_code=language_code
+        )
+        
+        if user:
+            await cache.set(f"user:{user_id}", user, expire=300, tags=[f"user:{user_id}"])
         
         return user
     
     @staticmethod
     async def update_user_premium(user_id: int, premium_until: datetime) -> bool:
         try:
-            await db.connection.execute("""
-                UPDATE users SET is_premium = 1, premium_until = ? WHERE id = ?
-            """, (premium_until.isoformat(), user_id))
-            await db.connection.commit()
+            await db.set_user_premium(user_id, premium_until)
             
-            await cache.delete(f"user:{user_id}")
+            await UserService.invalidate_user(user_id)
             return True
         except Exception:
             return False
@@ -40,11 +63,8 @@ class UserService:
         if user.get('premium_until'):
             premium_until = datetime.fromisoformat(user['premium_until'])
             if premium_until < datetime.now():
-                await db.connection.execute("""
-                    UPDATE users SET is_premium = 0, premium_until = NULL WHERE id = ?
-                """, (user_id,))
-                await db.connection.commit()
-                await cache.delete(f"user:{user_id}")
+                await db.set_user_premium(user_id, None)
+                await UserService.invalidate_user(user_id)
                 return False
         
         return True
@@ -57,10 +77,11 @@ class UserService:
         
         referral_link = f"https://t.me/{settings.BOT_USERNAME}?start=ref_{user['referral_code']}"
         
-        cursor = await db.connection.execute("""
-            SELECT COUNT(*) FROM users WHERE referred_by = ?
-        """, (user_id,))
-        referrals_count = (await cursor.fetchone())[0]
+        async with db.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT COUNT(*) FROM users WHERE referred_by = ?
+            """, (user_id,))
+            referrals_count = (await cursor.fetchone())[0]
         
         bonus_amount = referrals_count * 5000
         
@@ -74,25 +95,10 @@ class UserService:
     @staticmethod
     async def process_referral(user_id: int, referral_code: str) -> bool:
         try:
-            cursor = await db.connection.execute("""
-                SELECT id FROM users WHERE referral_code = ?
-            """, (referral_code,))
-            referrer = await cursor.fetchone()
+            referrer_id = await db.set_referrer(user_id, referral_code)
             
-            if referrer and referrer[0] != user_id:
-                await db.connection.execute("""
-                    UPDATE users SET referred_by = ?, total_referrals = total_referrals + 1 
-                    WHERE id = ?
-                """, (referrer[0], user_id))
-                
-                await db.connection.execute("""
-                    UPDATE users SET total_referrals = total_referrals + 1 WHERE id = ?
-                """, (referrer[0],))
-                
-                await db.connection.commit()
-                
-                await cache.delete(f"user:{user_id}")
-                await cache.delete(f"user:{referrer[0]}")
+            if referrer_id is not None:
+                await cache.invalidate_tags([f"user:{user_id}", f"user:{referrer_id}"])
                 
                 return True
         except Exception:
@@ -103,33 +109,36 @@ class UserService:
     @staticmethod
     async def get_user_analytics(user_id: int, days: int = 30) -> Dict[str, Any]:
         cache_key = f"user_analytics:{user_id}:{days}"
-        analytics = await cache.get(cache_key)
+        # Covers both sides: contests the user owns and contests the user joined or won
+        tags = [f"owner:{user_id}", f"participant:{user_id}"]
+        analytics = await cache.get(cache_key, tags=tags)
         
         if not analytics:
-            cursor = await db.connection.execute("""
-                SELECT COUNT(*) FROM contests WHERE owner_id = ? 
-                AND created_at >= datetime('now', '-{} days')
-            """.format(days), (user_id,))
-            contests_created = (await cursor.fetchone())[0]
-            
-            cursor = await db.connection.execute("""
-                SELECT COUNT(*) FROM participants p
-                JOIN contests c ON p.contest_id = c.id
-                WHERE c.owner_id = ? AND p.joined_at >= datetime('now', '-{} days')
-            """.format(days), (user_id,))
-            total_participants = (await cursor.fetchone())[0]
-            
-            cursor = await db.connection.execute("""
-                SELECT COUNT(*) FROM participants WHERE user_id = ? 
-                AND joined_at >= datetime('now', '-{} days')
-            """.format(days), (user_id,))
-            participated_contests = (await cursor.fetchone())[0]
-            
-            cursor = await db.connection.execute("""
-                SELECT COUNT(*) FROM winners WHERE user_id = ? 
-                AND announced_at >= datetime('now', '-{} days')
-            """.format(days), (user_id,))
-            won_contests = (await cursor.fetchone())[0]
+            async with db.reader() as conn:
+                cursor = await conn.execute("""
+                    SELECT COUNT(*) FROM contests WHERE owner_id = ? 
+                    AND created_at >= datetime('now', '-{} days')
+                """.format(days), (user_id,))
+                contests_created = (await cursor.fetchone())[0]
+                
+                cursor = await conn.execute("""
+                    SELECT COUNT(*) FROM participants p
+                    JOIN contests c ON p.contest_id = c.id
+                    WHERE c.owner_id = ? AND p.joined_at >= datetime('now', '-{} days')
+                """.format(days), (user_id,))
+                total_participants = (await cursor.fetchone())[0]
+                
+                cursor = await conn.execute("""
+                    SELECT COUNT(*) FROM participants WHERE user_id = ? 
+                    AND joined_at >= datetime('now', '-{} days')
+                """.format(days), (user_id,))
+                participated_contests = (await cursor.fetchone())[0]
+                
+                cursor = await conn.execute("""
+                    SELECT COUNT(*) FROM winners WHERE user_id = ? 
+                    AND announced_at >= datetime('now', '-{} days')
+                """.format(days), (user_id,))
+                won_contests = (await cursor.fetchone())[0]
             
             analytics = {
                 "contests_created": contests_created,
@@ -139,6 +148,6 @@ class UserService:
                 "success_rate": (won_contests / participated_contests * 100) if participated_contests > 0 else 0
             }
             
-            await cache.set(cache_key, analytics, expire=3600)
+            await cache.set(cache_key, analytics, expire=3600, tags=tags)
         
         return analytics
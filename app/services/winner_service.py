@@ -11,12 +11,19 @@ class WinnerService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    async def _users_in_order(self, user_ids: List[int]) -> List[User]:
+        # Only winner ids are cached, so a hit returns User rows just like a miss
+        result = await self.db.execute(select(User).where(User.id.in_(user_ids)))
+        users = {user.id: user for user in result.scalars().all()}
+        return [users[user_id] for user_id in user_ids if user_id in users]
+    
     async def select_winners(self, contest_id: int, winners_count: int) -> List[User]:
-        cache_key = f"contest_winners:{contest_id}"
-        cached_winners = await cache.get(cache_key)
+        cache_key = f"contest_winner_ids:{contest_id}"
+        tags = [f"contest:{contest_id}"]
+        cached_ids = await cache.get(cache_key, tags=tags)
         
-        if cached_winners:
-            return cached_winners
+        if cached_ids:
+            return await self._users_in_order(cached_ids)
         
         result = await self.db.execute(
             select(User)
@@ -60,15 +67,16 @@ class WinnerService:
         
         await self.db.commit()
         
-        await cache.set(cache_key, selected_winners, 3600)
+        await cache.set(cache_key, [winner.id for winner in selected_winners], 3600, tags=tags)
         return selected_winners
     
     async def get_contest_winners(self, contest_id: int) -> List[User]:
-        cache_key = f"contest_winners:{contest_id}"
-        cached_winners = await cache.get(cache_key)
+        cache_key = f"contest_winner_ids:{contest_id}"
+        tags = [f"contest:{contest_id}"]
+        cached_ids = await cache.get(cache_key, tags=tags)
         
-        if cached_winners:
-            return cached_winners
+        if cached_ids:
+            return await self._users_in_order(cached_ids)
         
         result = await self.db.execute(
             select(User)
@@ -79,7 +87,7 @@ class WinnerService:
         winners = list(result.scalars().all())
         
         if winners:
-            await cache.set(cache_key, winners, 3600)
+            await cache.set(cache_key, [winner.id for winner in winners], 3600, tags=tags)
         
         return winners
     
@@ -98,7 +106,7 @@ class WinnerService:
             winner.prize_claimed = True
             await self.db.commit()
             
-            await cache.delete(f"contest_winners:{contest_id}")
+            await cache.invalidate_tag("contest", contest_id)
     
     async def get_user_wins(self, user_id: int) -> List[Winner]:
         result = await self.db.execute(
@@ -0,0 +1,52 @@
+"""Compare the cache codec against the previous json.dumps/json.loads path.
+
+Usage: python -m benchmarks.cache_codec [iterations]
+"""
+from datetime import datetime, timedelta
+import json
+import sys
+import timeit
+
+from app.core import codec
+
+def _contest(i: int) -> dict:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return {
+        "id": i, "owner_id": 100000 + i, "channel_id": -1001234567890,
+        "title": f"Giveaway #{i}", "description": "Subscribe to the channel and press join " * 4,
+        "image_file_id": None, "winners_count": 3, "max_participants": 10000,
+        "participant_count": 4821, "status": "active",
+        "start_time": (now - timedelta(hours=2)).isoformat(), "end_time": (now + timedelta(days=3)).isoformat(),
+        "created_at": now.isoformat(), "updated_at": now.isoformat(),
+    }
+
+PAYLOADS = {
+    "user": {"id": 123456789, "username": "someone", "first_name": "Ali", "last_name": None,
+             "language_code": "uz", "is_premium": 0, "premium_until": None, "referral_code": "ZA0foXK3Fdw",
+             "referred_by": None, "is_active": 1, "is_banned": 0,
+             "created_at": "2024-01-01 12:00:00", "updated_at": "2024-01-01 12:00:00"},
+    "contest": _contest(1),
+    "user_contests (10)": [_contest(i) for i in range(10)],
+    "throttle window (30)": [1704110400.0 + i * 0.5 for i in range(30)],
+}
+
+def _bench(fn, iterations: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e6
+
+def main(iterations: int = 20000):
+    print(f"codec backend: {'orjson' if codec.orjson else 'json'}, {iterations} iterations, best of 3")
+    print(f"{'payload':<22}{'path':<8}{'encode us':>11}{'decode us':>11}{'bytes':>8}")
+    for name, value in PAYLOADS.items():
+        legacy = json.dumps(value).encode()
+        encoded = codec.encode(value)
+        assert codec.decode(encoded) == codec.decode(legacy) == value
+        
+        rows = [
+            ("json", lambda: json.dumps(value), lambda: json.loads(legacy), len(legacy)),
+            ("codec", lambda: codec.encode(value), lambda: codec.decode(encoded), len(encoded)),
+        ]
+        for path, enc, dec, size in rows:
+            print(f"{name:<22}{path:<8}{_bench(enc, iterations):>11.2f}{_bench(dec, iterations):>11.2f}{size:>8}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
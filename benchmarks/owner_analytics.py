@@ -0,0 +1,104 @@
+"""Compare the single-statement owner analytics against the previous eleven queries.
+
+Usage: python -m benchmarks.owner_analytics [sizes...]
+"""
+from datetime import datetime, timedelta
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core.database import Base, Contest, Participant
+from app.services.analytics_service import AnalyticsService
+
+OWNER_ID = 1
+STATUSES = ["pending", "active", "ended", "ended", "cancelled"]
+
+async def legacy_user_analytics(session, user_id: int) -> dict:
+    async def scalar(query):
+        return (await session.execute(query)).scalar()
+    
+    this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    owned = Contest.owner_id == user_id
+    return {
+        "total_contests": await scalar(select(func.count(Contest.id)).where(owned)),
+        "active_contests": await scalar(select(func.count(Contest.id)).where(and_(owned, Contest.status == "active"))),
+        "completed_contests": await scalar(select(func.count(Contest.id)).where(and_(owned, Contest.status == "ended"))),
+        "cancelled_contests": await scalar(select(func.count(Contest.id)).where(and_(owned, Contest.status == "cancelled"))),
+        "total_participants": await scalar(select(func.count(Participant.id)).join(Contest).where(owned)),
+        "total_views": await scalar(select(func.sum(Contest.view_count)).where(owned)),
+        "this_month_contests": await scalar(select(func.count(Contest.id)).where(and_(owned, Contest.created_at >= this_month))),
+        "last_month_contests": await scalar(select(func.count(Contest.id)).where(
+            and_(owned, Contest.created_at >= last_month, Contest.created_at < this_month))),
+        "avg_participants": await scalar(select(func.avg(Contest.participant_count)).where(
+            and_(owned, Contest.participant_count > 0))),
+        "max_participants": await scalar(select(func.max(Contest.participant_count)).where(owned)),
+        "min_participants": await scalar(select(func.min(Contest.participant_count)).where(
+            and_(owned, Contest.participant_count > 0))),
+    }
+
+def _populate(path: str, contests: int):
+    rng = random.Random(contests)
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, first_name) VALUES (?, ?)", (OWNER_ID, "Owner"))
+    conn.execute("INSERT INTO channels (channel_id, title, owner_id) VALUES (?, ?, ?)", (-100, "Channel", OWNER_ID))
+    
+    for contest_id in range(1, contests + 1):
+        participants = rng.choice([0, 0, 1, 2, 3, 5, 8])
+        created_at = now - timedelta(minutes=rng.randrange(120 * 24 * 60))
+        conn.execute("""
+            INSERT INTO contests (id, owner_id, channel_id, title, description, start_time, status,
+                                  view_count, participant_count, created_at)
+            VALUES (?, ?, -100, 'Contest', '', ?, ?, ?, ?, ?)
+        """, (contest_id, OWNER_ID, created_at, rng.choice(STATUSES), rng.randrange(500), participants, created_at))
+        conn.executemany(
+            "INSERT INTO participants (contest_id, user_id, joined_at) VALUES (?, ?, ?)",
+            [(contest_id, 1000 + i, created_at) for i in range(participants)]
+        )
+    conn.commit()
+    conn.close()
+
+async def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+async def run(contests: int, repeat: int = 5):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        _populate(path, contests)
+        
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            service = AnalyticsService(session)
+            legacy = await legacy_user_analytics(session, OWNER_ID)
+            current = await service._query_user_analytics(OWNER_ID)
+            for key, value in legacy.items():
+                assert abs((value or 0) - current[key]) < 1e-6, (key, value, current[key])
+            
+            legacy_ms = await _time(lambda: legacy_user_analytics(session, OWNER_ID), repeat)
+            current_ms = await _time(lambda: service._query_user_analytics(OWNER_ID), repeat)
+        await engine.dispose()
+    
+    print(f"{contests:>10}{legacy_ms:>14.2f}{current_ms:>14.2f}{legacy_ms / current_ms:>9.1f}x")
+
+async def main(sizes):
+    print(f"{'contests':>10}{'11 queries ms':>14}{'1 query ms':>14}{'speedup':>10}")
+    for contests in sizes:
+        await run(contests)
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]))
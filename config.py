@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     BOT_TOKEN: str = "6123456789:AAEhBOweik6ad2xkTVKlfPn7LMRjMOxdlUI"
@@ -18,12 +18,47 @@ class Settings(BaseSettings):
     WEBHOOK_SECRET: str = "your_webhook_secret_here"
     
     SECRET_KEY: str = "your-super-secret-key-here"
+    # Lifetime of signed /export download links, in seconds
+    EXPORT_LINK_TTL: int = 3600
     DEBUG: bool = True
     
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_POOL_SIZE: int = 10
+    REDIS_TIMEOUT: int = 5
+    REDIS_BREAKER_THRESHOLD: int = 5
+    REDIS_BREAKER_RESET_TIMEOUT: int = 30
     
     RATE_LIMIT_MESSAGES: int = 30
     RATE_LIMIT_WINDOW: int = 60
+    RATE_LIMIT_CHAT_MESSAGES: int = 60
+    RATE_LIMIT_CHAT_WINDOW: int = 60
+    RATE_LIMIT_GLOBAL_MESSAGES: int = 0
+    RATE_LIMIT_GLOBAL_WINDOW: int = 1
+    
+    # Handler name -> units charged against the user's rate limit (default 1)
+    THROTTLING_ROUTE_COSTS: Dict[str, int] = {
+        "process_channel": 5,
+        "process_channel_selection": 3,
+        "create_contest_callback": 2,
+        "check_subscription_callback": 2,
+        "my_contests_callback": 2,
+        "contest_stats_callback": 2,
+        "export_command": 10,
+        "export_analytics_command": 10,
+    }
+    # Handler name -> [limit, window seconds], an extra per-user budget for that route in the same cost units
+    THROTTLING_ROUTE_LIMITS: Dict[str, List[int]] = {
+        "process_channel": [25, 60],
+        "check_subscription_callback": [20, 60],
+        "export_command": [30, 600],
+    }
+    # Above this many in-flight updates, routes costing LOAD_SHED_MIN_COST or more are rejected
+    LOAD_SHED_INFLIGHT: int = 200
+    LOAD_SHED_MIN_COST: int = 2
+    
+    # Action ("callback:main_menu") or kind ("message") -> fraction of events recorded
+    ANALYTICS_SAMPLE_RATES: Dict[str, float] = {}
+    ANALYTICS_DEFAULT_SAMPLE_RATE: float = 1.0
     
     MAX_CONTEST_DURATION_DAYS: int = 30
     MAX_WINNERS_COUNT: int = 100
@@ -31,6 +66,12 @@ class Settings(BaseSettings):
     
     PREMIUM_PRICE: int = 50000
     
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_SIZE: int = 10000
+    CACHE_L1_TTL: int = 60
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    CACHE_FALLBACK_SIZE: int = 10000
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
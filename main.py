@@ -12,11 +12,13 @@ from aiogram.enums import ParseMode
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
 from config import settings
-from app.core.database import db
+from app.api.export import export_router
+from app.core.database import db, init_db as init_orm, close_db as close_orm
 from app.core.redis import cache
 from app.handlers import start, contest, menu, admin
 from app.middlewares.analytics import AnalyticsMiddleware
 from app.middlewares.throttling import ThrottlingMiddleware
+from app.middlewares.user_loader import UserLoaderMiddleware
 from app.services.scheduler import SchedulerService
 
 logging.basicConfig(
@@ -34,6 +36,8 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     await db.init_db()
+    # The ORM models (contest metrics and their rollups, owner_stats, the API routes) live on the engine
+    await init_orm()
     logger.info("Database initialized")
     
     # Initialize Redis
@@ -49,10 +53,21 @@ async def lifespan(app: FastAPI):
     dp = Dispatcher()
     
     # Add middlewares
-    dp.message.middleware(AnalyticsMiddleware())
-    dp.callback_query.middleware(AnalyticsMiddleware())
-    dp.message.middleware(ThrottlingMiddleware(settings.RATE_LIMIT_MESSAGES, settings.RATE_LIMIT_WINDOW))
-    dp.callback_query.middleware(ThrottlingMiddleware(settings.RATE_LIMIT_MESSAGES, settings.RATE_LIMIT_WINDOW))
+    dp.update.outer_middleware(AnalyticsMiddleware(
+        settings.ANALYTICS_SAMPLE_RATES, settings.ANALYTICS_DEFAULT_SAMPLE_RATE
+    ))
+    throttling = ThrottlingMiddleware(
+        settings.RATE_LIMIT_MESSAGES, settings.RATE_LIMIT_WINDOW,
+        chat_limit=settings.RATE_LIMIT_CHAT_MESSAGES, chat_window=settings.RATE_LIMIT_CHAT_WINDOW,
+        global_limit=settings.RATE_LIMIT_GLOBAL_MESSAGES, global_window=settings.RATE_LIMIT_GLOBAL_WINDOW,
+        route_costs=settings.THROTTLING_ROUTE_COSTS, route_limits=settings.THROTTLING_ROUTE_LIMITS,
+        exempt_ids=settings.ADMIN_IDS,
+        shed_in_flight=settings.LOAD_SHED_INFLIGHT, shed_min_cost=settings.LOAD_SHED_MIN_COST
+    )
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+    dp.message.middleware(UserLoaderMiddleware())
+    dp.callback_query.middleware(UserLoaderMiddleware())
     
     # Include routers
     dp.include_router(start.router)
@@ -88,16 +103,21 @@ async def lifespan(app: FastAPI):
     yield
     
     # Cleanup
-    if scheduler_service:
-        await scheduler_service.stop()
-    
-    if settings.USE_WEBHOOK:
-        await bot_instance.delete_webhook()
-    
-    await bot_instance.session.close()
-    await cache.close()
-    await db.close()
-    logger.info("Application shutdown complete")
+    try:
+        if scheduler_service:
+            await scheduler_service.stop()
+        
+        if settings.USE_WEBHOOK:
+            await bot_instance.delete_webhook()
+        
+        await bot_instance.session.close()
+        await cache.close()
+    finally:
+        # Flush queued fire-and-forget writes before the connections go away
+        await db.drain_writes()
+        await db.close()
+        await close_orm()
+        logger.info("Application shutdown complete")
 
 app = FastAPI(
     title="Konkurs Bot v3.0",
@@ -106,6 +126,8 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.include_router(export_router, prefix="/export")
+
 templates = Jinja2Templates(directory="templates")
 
 @app.get("/")
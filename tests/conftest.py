@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.core.config requires BOT_TOKEN and reads .env from the working directory; keep the deployment's .env out of tests
+os.environ.setdefault("BOT_TOKEN", "test")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
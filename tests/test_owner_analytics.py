@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+import asyncio
+import random
+import sqlite3
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core.database import Base
+from app.services.analytics_service import AnalyticsService
+
+OWNER_ID = 1
+STATUSES = ["pending", "active", "ended", "ended", "cancelled"]
+
+def _populate(path: str, contests: int):
+    rng = random.Random(contests)
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, first_name) VALUES (?, ?)", (OWNER_ID, "Owner"))
+    conn.execute("INSERT INTO channels (channel_id, title, owner_id) VALUES (?, ?, ?)", (-100, "Channel", OWNER_ID))
+    
+    for contest_id in range(1, contests + 1):
+        participants = rng.choice([0, 0, 1, 2, 3, 5])
+        created_at = now - timedelta(days=rng.randrange(90))
+        conn.execute("""
+            INSERT INTO contests (id, owner_id, channel_id, title, description, start_time, status, view_count, created_at)
+            VALUES (?, ?, -100, 'Contest', '', ?, 'pending', ?, ?)
+        """, (contest_id, OWNER_ID, created_at, rng.randrange(500), created_at))
+        # Joins and status changes after creation, so the summary is built by its update triggers
+        for i in range(participants):
+            conn.execute("INSERT INTO participants (contest_id, user_id) VALUES (?, ?)", (contest_id, 1000 + i))
+            conn.execute("UPDATE contests SET participant_count = participant_count + 1 WHERE id = ?", (contest_id,))
+        conn.execute("UPDATE contests SET status = ? WHERE id = ?", (rng.choice(STATUSES), contest_id))
+    
+    conn.execute("DELETE FROM participants WHERE contest_id = 1")
+    conn.execute("DELETE FROM contests WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+def test_owner_summary_matches_aggregate(tmp_path):
+    path = str(tmp_path / "owner.db")
+    
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            _populate(path, 200)
+            
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                service = AnalyticsService(session)
+                # SQLite reads the trigger-maintained summary
+                assert await service._query_user_analytics(OWNER_ID) == await service._query_owner_summary(OWNER_ID)
+                return (
+                    await service._query_owner_summary(OWNER_ID),
+                    await service._query_owner_aggregate(OWNER_ID),
+                    await service._query_owner_summary(OWNER_ID + 1),
+                    await service._query_owner_aggregate(OWNER_ID + 1)
+                )
+        finally:
+            await engine.dispose()
+    
+    summary, aggregate, empty_summary, empty_aggregate = asyncio.run(run())
+    assert summary.keys() == aggregate.keys()
+    for key in summary:
+        assert abs(summary[key] - aggregate[key]) < 1e-6, (key, summary[key], aggregate[key])
+    assert aggregate["total_contests"] == 199
+    assert empty_summary == empty_aggregate
@@ -0,0 +1,17 @@
+import asyncio
+
+from app.core.database import Database
+from app.core.migrations import MIGRATIONS, check_query_plans, get_schema_version
+
+def test_hot_queries_use_an_index(tmp_path):
+    async def run():
+        database = Database(str(tmp_path / "plans.db"), read_pool_size=0)
+        await database.init_db()
+        try:
+            assert await get_schema_version(database.connection) == MIGRATIONS[-1][0]
+            return await check_query_plans(database.connection)
+        finally:
+            await database.close()
+    
+    unindexed = asyncio.run(run())
+    assert unindexed == [], "\n".join(f"{name}: {' | '.join(plan)}" for name, plan in unindexed)